@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+""" Run noteout filter with the noteout daemon, if running.
+
+Link to this file with appropriate filename to make executable file for filter,
+as for ``wrap_noteout.py``.  For example, to make an executable filter
+`mark_notebooks.py`:::
+
+    ln -s wrap_daemon.py mark_notebooks.py
+
+If the daemon (``noteout-daemon``) is running, send the input to the daemon
+for filtering; otherwise run the filter in this process.
+"""
+
+import os.path as op
+
+from noteout.daemon import run_client
+
+if __name__ == "__main__":
+    run_client(op.splitext(op.basename(__file__))[0])
@@ -6,11 +6,16 @@ Link to this file with appropriate filename to make executable file for filter.
 For example, to make an executable filter `write_notebooks.py`:::
 
     ln -s wrap_noteout.py write_notebooks.py
+
+Quarto runs the filter in a new Python process for each document, so we only
+import the filter module, and use modules that Python has already imported at
+startup.
 """
 
-from pathlib import Path
+import os.path as op
 from importlib import import_module
 
 if __name__ == "__main__":
-    mod = import_module('noteout.' + Path(__file__).stem)
+    mod = import_module(
+        'noteout.' + op.splitext(op.basename(__file__))[0])
     mod.main()
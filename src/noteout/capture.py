@@ -0,0 +1,217 @@
+""" Capture documents and metadata to numbered files, for debugging
+
+The ``write_meta`` and ``write_doc`` filters use these routines to write
+numbered files such as ``meta_000.json``, ``meta_001.json`` ... .  We keep the
+next file number for each filename template in a counter file in the output
+directory, and create each file with ``O_EXCL``, so we never overwrite a file,
+even if another process is writing captures at the same time.
+
+Configure captures with document metadata in the ``noteout`` section:
+
+* ``capture-dir`` : directory for captures, relative to the current directory
+  (default ``.``).
+* ``capture-gzip`` : if True, compress captures with gzip, adding ``.gz`` to
+  the filename (default False).
+* ``capture-every`` : capture only every Nth document for each filter (default
+  1, meaning capture every document).
+* ``capture-match`` : if set, a regular expression; only capture documents
+  with an input file (from ``quarto-doc-params.input_file``) matching this
+  expression (default None).
+* ``capture-indent`` : indent for JSON output (default 2).  0 gives compact
+  JSON; for ``write_doc``, this writes the input JSON unchanged.
+
+We append a line of JSON for each capture to ``capture-index.jsonl`` in the
+capture directory, giving filename, filter, input file and format.
+"""
+
+from contextlib import contextmanager
+import gzip
+import json
+import os
+from pathlib import Path
+import re
+
+try:
+    import fcntl
+except ImportError:  # Windows.
+    fcntl = None
+
+
+CAPTURE_DEFAULTS = {
+    'capture-dir': '.',
+    'capture-gzip': False,
+    'capture-every': 1,
+    'capture-match': None,
+    'capture-indent': 2,
+}
+
+# Filename for counter file in capture directory.
+COUNTER_FNAME = '.noteout-capture-counts.json'
+
+# Filename for index of captures in capture directory.
+INDEX_FNAME = 'capture-index.jsonl'
+
+
+def capture_params(doc):
+    """ Capture parameters from metadata of Panflute document `doc`
+
+    Returns
+    -------
+    params : dict
+        Capture parameters, with keys from ``CAPTURE_DEFAULTS``, as well as
+        'input_file' and 'format' for the document.  'capture-indent' of None
+        means compact JSON.
+    """
+    params = {key: doc.get_metadata(f'noteout.{key}', default)
+              for key, default in CAPTURE_DEFAULTS.items()}
+    params['capture-indent'] = int(params['capture-indent'] or 0) or None
+    params['input_file'] = doc.get_metadata('quarto-doc-params.input_file')
+    params['format'] = doc.get_metadata('quarto-doc-params.out_format',
+                                        doc.format)
+    return params
+
+
+@contextmanager
+def _locked_counts(out_dir):
+    """ Yield dict of counts from counter file, write back on exit
+
+    We lock the counter file while in the context, where the platform allows.
+    """
+    fd = os.open(Path(out_dir) / COUNTER_FNAME, os.O_RDWR | os.O_CREAT, 0o644)
+    with os.fdopen(fd, 'r+') as fobj:
+        if fcntl:
+            fcntl.flock(fobj, fcntl.LOCK_EX)
+        content = fobj.read()
+        counts = json.loads(content) if content else {}
+        yield counts
+        fobj.seek(0)
+        fobj.truncate()
+        json.dump(counts, fobj)
+
+
+def _counts_for(counts, template):
+    return counts.setdefault(template, {'seen': 0, 'next': 0})
+
+
+def count_seen(template, out_dir='.'):
+    """ Return number of documents seen before for `template`, and count this one
+    """
+    with _locked_counts(out_dir) as counts:
+        template_counts = _counts_for(counts, template)
+        seen = template_counts['seen']
+        template_counts['seen'] = seen + 1
+    return seen
+
+
+def _open_excl(path):
+    return os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+
+@contextmanager
+def open_capture(template, out_dir='.', compress=False, max_n=None):
+    """ Open new numbered file from `template` for writing bytes
+
+    Parameters
+    ----------
+    template : str
+        Template for filename, to fill with ``template.format(n)``.
+    out_dir : str or :class:`Path`, optional
+        Directory for file.
+    compress : {False, True}, optional
+        If True, compress output with gzip, and add ``.gz`` to filename.
+    max_n : None or int, optional
+        If not None, raise RuntimeError if next file number is `max_n` or
+        greater.
+
+    Yields
+    ------
+    fobj : file-like
+        Binary file object for writing.
+    path : :class:`Path`
+        Path of opened file.
+    """
+    out_dir = Path(out_dir)
+    suffix = '.gz' if compress else ''
+    with _locked_counts(out_dir) as counts:
+        template_counts = _counts_for(counts, template)
+        n = template_counts['next']
+        while True:
+            if max_n is not None and n >= max_n:
+                raise RuntimeError(
+                    f'Ran out of files with max n {max_n} and '
+                    f'template "{template}"')
+            path = out_dir / (template.format(n) + suffix)
+            try:
+                fd = _open_excl(path)
+            except FileExistsError:
+                n += 1
+                continue
+            break
+        template_counts['next'] = n + 1
+    with os.fdopen(fd, 'wb') as fobj:
+        if not compress:
+            yield fobj, path
+            return
+        with gzip.GzipFile(fileobj=fobj, mode='wb', mtime=0) as gz_fobj:
+            yield gz_fobj, path
+
+
+def should_capture(template, params):
+    """ True if we should capture document with `params` for `template`
+
+    Counts the document as seen, for ``capture-every`` sampling, if it passes
+    any ``capture-match`` check.
+    """
+    if (pattern := params['capture-match']) is not None:
+        if not re.search(pattern, params['input_file'] or ''):
+            return False
+    out_dir = Path(params['capture-dir'])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    return count_seen(template, out_dir) % int(params['capture-every']) == 0
+
+
+def capture(template, params, write, filter_name):
+    """ Capture output of `write` to new file from `template`, if sampled
+
+    Parameters
+    ----------
+    template : str
+        Template for filename, as for :func:`open_capture`.
+    params : dict
+        Capture parameters, as from :func:`capture_params`.
+    write : callable
+        Callable accepting binary file object, to write capture.
+    filter_name : str
+        Name of capturing filter, for index.
+
+    Returns
+    -------
+    path : None or :class:`Path`
+        Path of capture, or None if we did not capture this document.
+    """
+    if not should_capture(template, params):
+        return None
+    out_dir = Path(params['capture-dir'])
+    with open_capture(template, out_dir, params['capture-gzip']) as (fobj,
+                                                                      path):
+        write(fobj)
+    entry = {'file': path.name,
+             'filter': filter_name,
+             'input_file': params['input_file'],
+             'format': params['format']}
+    with open(out_dir / INDEX_FNAME, 'a', encoding='utf-8') as index:
+        index.write(json.dumps(entry) + '\n')
+    return path
+
+
+def json_writer(obj, indent=2, default=None):
+    """ Return callable to write JSON for `obj` to binary file object
+    """
+
+    def write(fobj):
+        # Encode in chunks, without building the whole JSON string.
+        for chunk in json.JSONEncoder(indent=indent,
+                                      default=default).iterencode(obj):
+            fobj.write(chunk.encode('utf-8'))
+
+    return write
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+""" Panflute filter to run several noteout filters in one process
+
+Quarto starts a new Python process for each filter, and each process loads,
+walks, and dumps the document.  This filter loads the document once, runs the
+filters named in the document metadata, in order, over the loaded document,
+and dumps the result.  The output is the same as running the filters one after
+another.
+
+For example, in ``_quarto.yml``, replace::
+
+    filters:
+      - at: pre-ast
+        type: json
+        path: filter_pre.py
+      - at: pre-ast
+        type: json
+        path: filter_divspans.py
+      - at: pre-ast
+        type: json
+        path: mark_notebooks.py
+
+with::
+
+    filters:
+      - at: pre-ast
+        type: json
+        path: chain.py
+
+    noteout:
+      chain: [pre, divspans, mark]
+
+where ``chain.py`` is a link to ``wrap_noteout.py`` (see ``extra``).  Any other
+filters, such as Lua filters, between the fused filters, must run before or
+after the chain.
+
+The ``post_chain`` filter does the same for filters named in
+``noteout.post-chain``, so you can fuse filters at two stages of Quarto
+processing, for example with ``post-chain: [export, nb-only]`` for the
+``post-quarto`` stage.
+"""
+
+from importlib import import_module
+
+import panflute as pf
+
+from noteout.nutils import FilterError
+
+
+# Names for chain filters, and their modules.
+CHAIN_FILTERS = {
+    'pre': 'filter_pre',
+    'divspans': 'filter_divspans',
+    'nb-only': 'filter_nb_only',
+    'code': 'filter_code',
+    'mark': 'mark_notebooks',
+    'export': 'export_notebooks',
+    'write-meta': 'write_meta',
+    'write-doc': 'write_doc',
+}
+
+
+def get_chain(doc, metadata_field='noteout.chain'):
+    """ Return filter names from `metadata_field` of `doc`
+    """
+    names = doc.get_metadata(metadata_field, [])
+    names = [names] if isinstance(names, str) else list(names)
+    if (unknown := [n for n in names if n not in CHAIN_FILTERS]):
+        raise FilterError(
+            f'Unknown filter(s) {unknown} in {metadata_field}; '
+            f'filters should be from {list(CHAIN_FILTERS)}')
+    return names
+
+
+def run_chain(doc, names):
+    """ Run filters named in `names` over `doc`, in order
+
+    Parameters
+    ----------
+    doc : :class:`pf.Doc`
+        Document to filter, in place.
+    names : sequence
+        Names of filters, from keys of ``CHAIN_FILTERS``.
+
+    Returns
+    -------
+    doc : :class:`pf.Doc`
+        Filtered document.
+    """
+    for name in names:
+        mod = import_module('noteout.' + CHAIN_FILTERS[name])
+        mod.main(doc=doc)
+    return doc
+
+
+def main(doc=None, metadata_field='noteout.chain'):
+    if doc is not None:
+        return run_chain(doc, get_chain(doc, metadata_field))
+    doc = pf.load()
+    pf.dump(run_chain(doc, get_chain(doc, metadata_field)))
+
+
+if __name__ == "__main__":
+    main()
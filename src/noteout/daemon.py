@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+""" Resident server to run noteout filters, and client to call it
+
+Quarto starts a new Python process for each filter and each document, and
+each process must start Python and import Panflute before it can filter.  The
+daemon imports the filters once, and listens on a Unix socket for requests to
+filter documents.
+
+Start the daemon with::
+
+    noteout-daemon &
+
+The client sends the filter name, command line arguments, working directory,
+environment and input JSON to the daemon, and writes the daemon's output to
+stdout.  If there is no daemon running, the client runs the filter in its own
+process.  To use the client as a Quarto filter, link ``extra/wrap_daemon.py``
+to a filename for the filter, as for ``extra/wrap_noteout.py``::
+
+    ln -s wrap_daemon.py mark_notebooks.py
+
+The daemon runs one filter at a time, because filters use the process working
+directory and environment.
+
+Both daemon and client use the socket path in environment variable
+``NOTEOUT_DAEMON_SOCKET``, if set, or ``noteout.sock`` in the private
+directory ``$XDG_RUNTIME_DIR``, or, if that is not set, in directory
+``$TMPDIR/noteout-<uid>``, that the daemon creates, readable only by the
+current user.  The client only connects to a socket owned by the current
+user, and otherwise runs the filter in its own process.
+
+This module only imports standard library modules at module level, so the
+client starts quickly.
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from importlib import import_module
+from io import BytesIO, StringIO, TextIOWrapper
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import traceback
+
+# Filter modules that the daemon will run.
+DAEMON_FILTERS = ('filter_pre', 'filter_divspans', 'filter_nb_only',
+                  'filter_code', 'mark_notebooks', 'export_notebooks',
+                  'write_meta', 'write_doc', 'chain', 'post_chain')
+
+
+def default_socket_path():
+    """ Socket path from environment, or default path in private directory
+    """
+    if (path := os.environ.get('NOTEOUT_DAEMON_SOCKET')):
+        return path
+    return os.path.join(_private_dir(), 'noteout.sock')
+
+
+def _private_dir():
+    if (run_dir := os.environ.get('XDG_RUNTIME_DIR')):
+        return run_dir
+    tmp_dir = os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(tmp_dir, f'noteout-{os.getuid()}')
+
+
+def _make_private_dir(path):
+    """ Make directory `path` if absent, check only current user can use it
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if (not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or
+        st.st_mode & 0o077):
+        raise RuntimeError(
+            f'Socket directory {path} should be a directory owned by, and '
+            'only accessible to, the current user')
+
+
+def run_filter(filter_name, in_bytes, argv=(), cwd=None, env=None):
+    """ Run filter `filter_name` in this process, on Pandoc JSON `in_bytes`
+
+    Parameters
+    ----------
+    filter_name : str
+        Name of filter module, from ``DAEMON_FILTERS``.
+    in_bytes : bytes
+        Pandoc JSON input.
+    argv : sequence, optional
+        Command line arguments after the command name, as passed to the filter
+        by Pandoc or Quarto.  The first is the output format.
+    cwd : None or str, optional
+        Working directory in which to run the filter.  None means use current
+        directory.
+    env : None or dict, optional
+        Environment variables for filter.  None means use current environment.
+
+    Returns
+    -------
+    status : int
+        0 for success, 1 for error.
+    out_bytes : bytes
+        Output from filter.
+    err : str
+        Error output from filter, including any traceback.
+    """
+    if filter_name not in DAEMON_FILTERS:
+        return 1, b'', (f'Unknown filter "{filter_name}"; '
+                        f'filter should be one of {DAEMON_FILTERS}\n')
+    saved = (sys.argv, sys.stdin, sys.stdout, sys.stderr, os.getcwd(),
+             dict(os.environ))
+    out_buf = BytesIO()
+    out_buf.close = lambda: None  # Keep buffer when stdout replaced.
+    sys.argv = [filter_name] + list(argv)
+    sys.stdin = TextIOWrapper(BytesIO(in_bytes), 'utf-8')
+    sys.stdout = TextIOWrapper(out_buf, 'utf-8')
+    sys.stderr = err_io = StringIO()
+    status = 0
+    try:
+        if cwd is not None:
+            os.chdir(cwd)
+        if env is not None:
+            os.environ.clear()
+            os.environ.update(env)
+        import_module('noteout.' + filter_name).main()
+        sys.stdout.flush()
+    except (Exception, SystemExit):
+        status = 1
+        traceback.print_exc(file=err_io)
+    finally:
+        sys.argv, sys.stdin, sys.stdout, sys.stderr, cwd, env = saved
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(env)
+    return status, out_buf.getvalue(), err_io.getvalue()
+
+
+class FilterHandler(socketserver.StreamRequestHandler):
+    """ Handle one request to run a filter
+
+    The request is a line of JSON giving the filter name, arguments, working
+    directory and environment, followed by the Pandoc JSON input.  The
+    response is a line of JSON giving the status and error output, followed by
+    the filter output.
+    """
+
+    def handle(self):
+        header = json.loads(self.rfile.readline())
+        in_bytes = self.rfile.read()
+        status, out_bytes, err = run_filter(header['filter'],
+                                            in_bytes,
+                                            header.get('argv', ()),
+                                            header.get('cwd'),
+                                            header.get('env'))
+        self.wfile.write(json.dumps({'status': status, 'stderr': err})
+                         .encode('utf-8') + b'\n')
+        self.wfile.write(out_bytes)
+
+
+def make_server(socket_path=None):
+    """ Make Unix socket server for filter requests, at `socket_path`
+
+    Parameters
+    ----------
+    socket_path : None or str, optional
+        Path for socket.  None gives :func:`default_socket_path`, and we make
+        the default private directory for the socket, if necessary.  We
+        remove any existing socket at this path, owned by the current user,
+        without a listening server.
+
+    Returns
+    -------
+    server : :class:`socketserver.UnixStreamServer`
+        Server, bound to `socket_path`, readable only by the current user.
+
+    Raises
+    ------
+    RuntimeError
+        If a daemon is already listening at `socket_path`, or there is an
+        existing file at `socket_path` that is not a socket owned by the
+        current user.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+        if not os.environ.get('NOTEOUT_DAEMON_SOCKET'):
+            _make_private_dir(os.path.dirname(socket_path))
+    if os.path.lexists(socket_path):
+        try:
+            with _connect(socket_path):
+                pass
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+        except OSError as e:
+            raise RuntimeError(f'Cannot use socket at {socket_path}: {e}')
+        else:
+            raise RuntimeError(f'Daemon already listening at {socket_path}')
+    old_umask = os.umask(0o177)
+    try:
+        return socketserver.UnixStreamServer(socket_path, FilterHandler)
+    finally:
+        os.umask(old_umask)
+
+
+def preload():
+    """ Import filters, and modules they import on use
+    """
+    for name in DAEMON_FILTERS:
+        import_module('noteout.' + name)
+    import_module('jupytext')
+    import_module('noteout.nbio')
+
+
+def _connect(socket_path):
+    """ Socket connected to `socket_path`, if owned by current user
+    """
+    st = os.stat(socket_path)
+    if not stat.S_ISSOCK(st.st_mode) or st.st_uid != os.getuid():
+        raise PermissionError(
+            f'{socket_path} is not a socket owned by the current user')
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def request(sock, filter_name, in_bytes, argv=(), cwd=None, env=None):
+    """ Send filter request over connected socket `sock`, return response
+
+    Parameters are as for :func:`run_filter`, but `cwd` of None means use the
+    current directory, and `env` of None means use the current environment.
+
+    Returns
+    -------
+    status : int
+        0 for success, 1 for error.
+    out_bytes : bytes
+        Output from filter.
+    err : str
+        Error output from filter.
+    """
+    header = {'filter': filter_name,
+              'argv': list(argv),
+              'cwd': os.getcwd() if cwd is None else cwd,
+              'env': dict(os.environ) if env is None else env}
+    sock.sendall(json.dumps(header).encode('utf-8') + b'\n')
+    sock.sendall(in_bytes)
+    sock.shutdown(socket.SHUT_WR)
+    with sock.makefile('rb') as fobj:
+        response = json.loads(fobj.readline())
+        out_bytes = fobj.read()
+    return response['status'], out_bytes, response['stderr']
+
+
+def run_client(filter_name, socket_path=None):
+    """ Run filter `filter_name` on stdin with daemon, or in this process
+
+    Write filter output to stdout.  If no daemon is listening at
+    `socket_path`, or the socket is not owned by the current user, import and
+    run the filter in this process.
+    """
+    socket_path = default_socket_path() if socket_path is None else socket_path
+    try:
+        sock = _connect(socket_path)
+    except OSError:
+        return import_module('noteout.' + filter_name).main()
+    with sock:
+        status, out_bytes, err = request(sock,
+                                         filter_name,
+                                         sys.stdin.buffer.read(),
+                                         sys.argv[1:])
+    sys.stderr.write(err)
+    sys.stdout.flush()
+    sys.stdout.buffer.write(out_bytes)
+    sys.stdout.buffer.flush()
+    if status:
+        sys.exit(status)
+
+
+def get_parser():
+    parser = ArgumentParser(description=__doc__,  # Usage from docstring
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--socket',
+                        help='Path for Unix socket (default from '
+                        'NOTEOUT_DAEMON_SOCKET or private directory)')
+    return parser
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    preload()
+    try:
+        server = make_server(args.socket)
+    except RuntimeError as e:
+        sys.exit(f'noteout-daemon: {e}')
+    # Clean up socket on kill, as well as on interrupt.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(server.server_address)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,18 +21,21 @@ The suitable processing is:
 We detect notebooks simply by starting notebooks after a start marker, and
 finishing before the end marker, using a search through the top level of tree,
 and any divs contained therein.
+
+We do not modify the document, so, when reading from stdin, we write the input
+document to stdout unchanged, without re-encoding.
 """
 
 from pathlib import Path
 import re
 import zipfile
 
-import jupytext as jpt
 import panflute as pf
 from panflute import Str, Strong, Space
 
 from noteout.nutils import (is_div_class, FilterError, name2title, fmt2fmt,
-                            fill_params, find_data_files)
+                            fill_params, find_data_files, json2doc,
+                            pass_through)
 
 _REQUIRED_NOTEOUT_KEYS = ()
 
@@ -162,10 +165,13 @@ def write_notebook_files(nb_doc, attrs):
     out_nb_dir = attrs['nb_out_path']
     out_nb_fpath = out_nb_dir / '{name}.{nb-format}'.format(**attrs)
     out_nb_dir.mkdir(parents=True, exist_ok=True)
+    # Import on use; Jupytext and nbio imports are slow.
+    import jupytext as jpt
+    from noteout.nbio import write_nb
     nb_md = ('# {title}\n\n\n'.format(**attrs) +
              fmt2fmt(nb_doc, in_fmt='panflute'))
     nb = jpt.reads(proc_nb_text(nb_md), 'Rmd')
-    jpt.write(nb, out_nb_fpath, fmt=attrs['nb-format'])
+    write_nb(nb, out_nb_fpath, fmt=attrs['nb-format'])
     # Write associated data files.
     if not (dfs := find_data_files(nb)):
         return
@@ -218,11 +224,17 @@ def finalize(doc):
         write_notebook_files(nb_doc, {**attrs, **params})
 
 
+def finalize_json(json_src):
+    finalize(json2doc(json_src))
+
+
 def action(elem, doc):
     pass
 
 
 def main(doc=None):
+    if doc is None:
+        return pass_through(finalize_json)
     return pf.run_filter(action=action,
                          prepare=None,
                          finalize=finalize,
@@ -5,7 +5,6 @@
 import re
 
 import panflute as pf
-from jupytext import cell_metadata as jcm
 
 from noteout.nutils import Filter
 
@@ -17,6 +16,10 @@ class CodeFilter(Filter):
 
     metadata_field = 'noteout.filter-langs'
 
+    raw_types = ('Code', 'CodeBlock')
+
+    target_types = (pf.Code, pf.CodeBlock)
+
     @classmethod
     def get_bad_names(cls, doc):
         dds = doc.get_metadata(cls.metadata_field)
@@ -26,20 +29,39 @@ class CodeFilter(Filter):
 
     @classmethod
     def action(cls, elem, doc):
-        bad_names = doc.bad_names
         if isinstance(elem, pf.Code):
-            if not (match := CODE_CONFIG_RE.match(elem.text)):
-                return
-            lang, opts = jcm.rmd_options_to_metadata(match.groups()[0])
+            is_bad = cls._is_bad_code(elem.text, doc.bad_names)
         elif isinstance(elem, pf.CodeBlock):
-            if not elem.classes:
-                return
-            lang, opts = elem.classes[0], {}
+            is_bad = cls._is_bad_block(elem.classes, doc.bad_names)
         else:
             return
-        if not opts.get('all_eds', False) and lang.lower() in bad_names:
+        if is_bad:
             return []
 
+    @classmethod
+    def drop_raw(cls, node, bad_names):
+        (_, classes, _), text = node['c']
+        if node['t'] == 'Code':
+            return cls._is_bad_code(text, bad_names)
+        return cls._is_bad_block(classes, bad_names)
+
+    @classmethod
+    def _is_bad_code(cls, text, bad_names):
+        if not (match := CODE_CONFIG_RE.match(text)):
+            return False
+        # Import on use; Jupytext is slow to import.
+        from jupytext import cell_metadata as jcm
+        lang, opts = jcm.rmd_options_to_metadata(match.groups()[0])
+        return cls._is_bad_lang(lang, opts, bad_names)
+
+    @classmethod
+    def _is_bad_block(cls, classes, bad_names):
+        return bool(classes) and cls._is_bad_lang(classes[0], {}, bad_names)
+
+    @staticmethod
+    def _is_bad_lang(lang, opts, bad_names):
+        return not opts.get('all_eds', False) and lang.lower() in bad_names
+
 
 def main(doc=None):
     CodeFilter.main(doc=doc)
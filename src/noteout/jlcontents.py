@@ -0,0 +1,106 @@
+""" Write static JupyterLite contents index for directory
+
+JupyterLite reads listings of its contents from
+``api/contents/<directory>/all.json`` files.  Writing these for the notebook
+output directory means JupyterLite does not need to index the contents
+during its own build.
+"""
+
+from datetime import datetime, timezone
+import json
+import mimetypes
+from pathlib import Path
+
+from noteout.sync import write_changed
+
+
+# Mimetypes missing from or different to the Python mimetypes database.
+_MIMETYPES = {'.ipynb': 'application/x-ipynb+json',
+              '.md': 'text/markdown',
+              '.Rmd': 'text/x-rmarkdown',
+              '.csv': 'text/csv'}
+
+
+def write_contents_index(root_path, index_path=None, exclude=()):
+    """ Write JupyterLite contents ``all.json`` listings for `root_path`
+
+    Parameters
+    ----------
+    root_path : str or :class:`Path`
+        Directory of contents to index.
+    index_path : None or str or :class:`Path`, optional
+        Directory to which to write listings; listing for subdirectory
+        ``sub/dir`` of `root_path` goes to ``index_path / 'sub' / 'dir' /
+        'all.json'``.  None gives ``root_path / 'api' / 'contents'``.  If
+        `index_path` is inside `root_path`, we do not index the top-level
+        directory containing `index_path` (``api`` by default).
+    exclude : sequence, optional
+        Paths, relative to `root_path`, of files or directories to leave out
+        of the index.  We always leave out hidden files and directories, and
+        files ending in ``.gz``.
+
+    Returns
+    -------
+    written : list
+        Paths of listing files that we wrote, because they changed.
+    """
+    root_path = Path(root_path)
+    index_path = (root_path / 'api' / 'contents' if index_path is None
+                  else Path(index_path))
+    excluded = {(root_path / p).resolve() for p in exclude}
+    # Make index directory before listing, so directory times are stable.
+    index_path.mkdir(parents=True, exist_ok=True)
+    index_path = index_path.resolve()
+    root_path = root_path.resolve()
+    if root_path in index_path.parents:
+        excluded.add(root_path / index_path.relative_to(root_path).parts[0])
+    written = []
+    for dir_path, models in _dir_models(root_path, root_path, excluded):
+        listing = _model(dir_path, root_path)
+        listing.update(content=models, format='json')
+        out_path = index_path / dir_path.relative_to(root_path) / 'all.json'
+        content = json.dumps(listing, indent=1, sort_keys=True) + '\n'
+        if write_changed(out_path, content.encode('utf-8')):
+            written.append(out_path)
+    return written
+
+
+def _dir_models(dir_path, root_path, excluded):
+    """ Generate directory paths and models for directory contents
+    """
+    paths = [p for p in sorted(dir_path.iterdir())
+             if not (p.name.startswith('.') or p.suffix == '.gz'
+                     or p.resolve() in excluded)]
+    yield dir_path, [_model(p, root_path) for p in paths]
+    for path in paths:
+        if path.is_dir():
+            yield from _dir_models(path, root_path, excluded)
+
+
+def _model(path, root_path):
+    """ Contents model, without content, for `path`
+    """
+    stat = path.stat()
+    timestamp = datetime.fromtimestamp(
+        stat.st_mtime, timezone.utc).isoformat().replace('+00:00', 'Z')
+    is_dir = path.is_dir()
+    if is_dir:
+        model_type, mimetype, size = 'directory', None, None
+    else:
+        model_type = 'notebook' if path.suffix == '.ipynb' else 'file'
+        mimetype = (_MIMETYPES.get(path.suffix) or
+                    mimetypes.guess_type(path.name)[0])
+        size = stat.st_size
+    rel_path = path.relative_to(root_path).as_posix()
+    return {'name': '' if rel_path == '.' else path.name,
+            'path': '' if rel_path == '.' else rel_path,
+            'type': model_type,
+            'mimetype': mimetype,
+            'size': size,
+            'created': timestamp,
+            'last_modified': timestamp,
+            'content': None,
+            'format': None,
+            'hash': None,
+            'hash_algorithm': None,
+            'writable': True}
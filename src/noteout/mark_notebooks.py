@@ -84,7 +84,6 @@ expand Quarto-specific stuff such as cross-references inside the notebook text.
 
 import os.path as op
 
-import jupytext as jpt
 import panflute as pf
 
 from noteout.nutils import (fmt2fmt, FilterError, is_div_class, name2title,
@@ -180,6 +179,8 @@ def get_dl_rel_url(params, n_dfs):
 def action(elem, doc):
     if not is_nb_div(elem):
         return
+    # Import on use; Jupytext is slow to import.
+    import jupytext as jpt
     # Flatten out div.  This avoids loss of Quarto sections inside divs.
     elem_out = list(elem.content)
     # Detect data files (for download links).
@@ -0,0 +1,238 @@
+""" Read and write notebooks, with fast path for ipynb format
+
+Jupytext reads and writes all notebook formats, but, for ipynb files, it goes
+through format detection, validation, and a full copy of the notebook on
+write.  For ipynb files, we read and write the nbformat JSON directly, and use
+Jupytext for the text formats.  We use ``orjson``, if installed, for decoding
+JSON, and for encoding minified JSON.
+
+The ipynb output, without minification, is the same as the output from
+``jupytext.write``.
+"""
+
+from copy import copy
+import json
+from pathlib import Path
+
+import jupytext
+from jupytext.formats import rearrange_jupytext_metadata
+from nbformat import from_dict
+from nbformat.v4.rwbase import rejoin_lines, strip_transient
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Mimetypes, other than text/*, with values split into lines for ipynb.
+_NON_TEXT_SPLIT_MIMES = {'application/javascript', 'image/svg+xml'}
+
+# Notebook metadata keys not stored in ipynb files.
+_TRANSIENT_NB_KEYS = ('orig_nbformat', 'orig_nbformat_minor', 'signature')
+
+# Cell metadata keys recording execution or display state, for `strip_meta`.
+_VOLATILE_CELL_KEYS = ('execution', 'ExecuteTime', 'collapsed', 'scrolled')
+
+
+def nb_fmt(path, fmt=None):
+    """ Notebook format from `fmt` or, if `fmt` is None, from `path` extension
+    """
+    return Path(path).suffix[1:] if fmt is None else fmt
+
+
+def is_ipynb(fmt):
+    return fmt.lstrip('.') == 'ipynb'
+
+
+def read_nb(path, fmt=None):
+    """ Read notebook from `path`, with format `fmt`
+
+    Parameters
+    ----------
+    path : str or :class:`Path`
+        Path to notebook.
+    fmt : None or str, optional
+        Format of notebook, as for Jupytext.  None means get format from
+        extension of `path`.
+
+    Returns
+    -------
+    nb : :class:`nbformat.NotebookNode`
+        Notebook.
+    """
+    if is_ipynb(nb_fmt(path, fmt)):
+        return reads_ipynb(Path(path).read_bytes())
+    return jupytext.read(path, fmt=fmt)
+
+
+def reads_ipynb(content):
+    """ Read notebook from ipynb JSON `content`
+
+    Parameters
+    ----------
+    content : str or bytes
+        JSON for notebook.
+
+    Returns
+    -------
+    nb : :class:`nbformat.NotebookNode`
+        Notebook.
+    """
+    nb_dict = orjson.loads(content) if orjson else json.loads(content)
+    if nb_dict.get('nbformat') != 4:  # Jupytext warns or converts.
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        return jupytext.reads(content, 'ipynb')
+    nb = rejoin_lines(from_dict(nb_dict))
+    strip_transient(nb)
+    rearrange_jupytext_metadata(nb.metadata)
+    return nb
+
+
+def write_nb(nb, path, fmt=None, minify=False, strip_meta=False):
+    """ Write notebook `nb` to `path` in format `fmt`
+
+    Parameters
+    ----------
+    nb : :class:`nbformat.NotebookNode`
+        Notebook to write.
+    path : str or :class:`Path`
+        Path to which to write.
+    fmt : None or str, optional
+        Format of notebook, as for Jupytext.  None means get format from
+        extension of `path`.
+    minify : {False, True}, optional
+        If True, and format is ipynb, write JSON without indentation or
+        whitespace.
+    strip_meta : {False, True}, optional
+        If True, and format is ipynb, do not write cell metadata recording
+        execution or display state.
+
+    Returns
+    -------
+    content : bytes
+        Bytes written to `path`.
+    """
+    content = nb2bytes(nb, nb_fmt(path, fmt), minify, strip_meta)
+    Path(path).write_bytes(content)
+    return content
+
+
+def nb2bytes(nb, fmt, minify=False, strip_meta=False):
+    """ Return file contents of notebook `nb` in format `fmt`
+
+    Parameters
+    ----------
+    nb : :class:`nbformat.NotebookNode`
+        Notebook.
+    fmt : str
+        Format of notebook, as for Jupytext.
+    minify : {False, True}, optional
+        If True, and format is ipynb, return JSON without indentation or
+        whitespace.
+    strip_meta : {False, True}, optional
+        If True, and format is ipynb, leave out cell metadata recording
+        execution or display state.
+
+    Returns
+    -------
+    content : bytes
+        File contents, ending in newline.
+    """
+    if is_ipynb(fmt):
+        return writes_ipynb(nb, minify, strip_meta).encode('utf-8')
+    content = jupytext.writes(nb, fmt)
+    return (content if content.endswith('\n') else content + '\n').encode(
+        'utf-8')
+
+
+def writes_ipynb(nb, minify=False, strip_meta=False):
+    """ Return ipynb JSON for notebook `nb`
+
+    Does not modify, or copy, cells of `nb`.
+
+    Parameters
+    ----------
+    nb : :class:`nbformat.NotebookNode`
+        Notebook.
+    minify : {False, True}, optional
+        If True, return JSON without indentation or whitespace.
+    strip_meta : {False, True}, optional
+        If True, leave out cell metadata recording execution or display
+        state, such as execution times.
+
+    Returns
+    -------
+    content : str
+        JSON for notebook, ending in newline.
+    """
+    drop_keys = {'trusted'}
+    if strip_meta:
+        drop_keys.update(_VOLATILE_CELL_KEYS)
+    out = {'cells': [_split_cell(cell, drop_keys) for cell in nb['cells']],
+           'metadata': _ipynb_metadata(nb['metadata']),
+           'nbformat': nb['nbformat'],
+           'nbformat_minor': nb['nbformat_minor']}
+    if minify:
+        if orjson:
+            return orjson.dumps(
+                out, option=orjson.OPT_SORT_KEYS).decode('utf-8') + '\n'
+        return json.dumps(out, sort_keys=True, separators=(',', ':'),
+                          ensure_ascii=False) + '\n'
+    return json.dumps(out, sort_keys=True, indent=1, separators=(',', ': '),
+                      ensure_ascii=False) + '\n'
+
+
+def _ipynb_metadata(metadata):
+    """ Notebook `metadata` as Jupytext writes it to ipynb
+    """
+    metadata = {k: v for k, v in metadata.items()
+                if k not in _TRANSIENT_NB_KEYS}
+    if 'jupytext' in metadata:
+        metadata['jupytext'] = copy(metadata['jupytext'])
+    rearrange_jupytext_metadata(metadata)
+    jupytext_metadata = metadata.get('jupytext', {})
+    jupytext_metadata.pop('text_representation', None)
+    if not jupytext_metadata:
+        metadata.pop('jupytext', None)
+    return metadata
+
+
+def _split_cell(cell, drop_keys=frozenset({'trusted'})):
+    """ Copy of `cell` with multiline strings split, as for ipynb files
+
+    Leave out metadata keys in `drop_keys`.
+    """
+    out = dict(cell)
+    if isinstance(source := cell.get('source'), str):
+        out['source'] = source.splitlines(True)
+    if not drop_keys.isdisjoint(metadata := cell.get('metadata', {})):
+        out['metadata'] = {k: v for k, v in metadata.items()
+                           if k not in drop_keys}
+    if 'attachments' in cell:
+        out['attachments'] = {k: _split_bundle(v)
+                              for k, v in cell['attachments'].items()}
+    if cell.get('cell_type') == 'code':
+        out['outputs'] = [_split_output(o) for o in cell['outputs']]
+    return out
+
+
+def _split_output(output):
+    output_type = output['output_type']
+    if output_type in ('execute_result', 'display_data') and 'data' in output:
+        out = dict(output)
+        out['data'] = _split_bundle(output['data'])
+        return out
+    if output_type == 'stream' and isinstance(output['text'], str):
+        out = dict(output)
+        out['text'] = output['text'].splitlines(True)
+        return out
+    return output
+
+
+def _split_bundle(data):
+    return {k: (v.splitlines(True) if isinstance(v, str) and
+                (k.startswith('text/') or k in _NON_TEXT_SPLIT_MIMES)
+                else v)
+            for k, v in data.items()}
@@ -2,11 +2,18 @@
 """
 
 from copy import deepcopy
+import json
+import os
 from pathlib import Path
 import re
+import sys
 
 import panflute as pf
 
+# Patch Panflute for Quarto RawBlocks:
+# https://github.com/sergiocorreia/panflute/pull/251
+pf.elements.RAW_FORMATS.add('latex-merge')
+
 
 class NO_DEFAULT:
     """ Indicates there should be no default value
@@ -29,18 +36,34 @@ _META_DEFAULTS = {
 # Meaning of '+' in noteout.nb-flatten-divspans.
 _FLATTEN_DS_PLUS = ('header-section-number', 'nb-only')
 
-# Regular expression to detect ```{r} etc code blocks.
-_BACKTICK_BLOCK_RE = re.compile(
-    r'''^
+# Regular expression parts to detect start and end of ```{r} etc code blocks.
+_BACKTICK_START_PAT = r'''^
     ^(?P<starti>\s*)```\s*
     \{(?P<lang>\w+)
     (?P<lparams>\s+.*?)?
     \}
     \s*$
-    (?P<block>.*?)
+    '''
+_BACKTICK_END_PAT = r'''
     ^(?P<endi>\s*)```\s*$
-    ''',
-    re.VERBOSE | re.MULTILINE | re.DOTALL)
+    '''
+_BACKTICK_FLAGS = re.VERBOSE | re.MULTILINE | re.DOTALL
+
+# Regular expression to detect ```{r} etc code blocks.
+_BACKTICK_BLOCK_RE = re.compile(
+    _BACKTICK_START_PAT + '(?P<block>.*?)' + _BACKTICK_END_PAT,
+    _BACKTICK_FLAGS)
+
+# Parts of code blocks, for line scanner in ``quartoize``.  The scanner
+# matches the start of code blocks in parts, as for ``_BACKTICK_START_PAT``.
+_BACKTICK_HEAD_RE = re.compile(r'^(?P<starti>\s*)```\s*\{(?P<lang>\w+)',
+                               _BACKTICK_FLAGS)
+# Closing brace of code block start, followed only by whitespace to line end.
+_BACKTICK_CLOSE_RE = re.compile(r'\}[^\S\n]*$', re.MULTILINE)
+_WS_RE = re.compile(r'\s*')
+_BACKTICK_END_RE = re.compile(_BACKTICK_END_PAT, _BACKTICK_FLAGS)
+# Line that may start a code block.
+_FENCE_LINE_RE = re.compile(r'^[^\S\n]*```\s*\{', re.MULTILINE)
 
 # Replacement pattern for ```{r} etc code blocks.
 _BACKTICK_SUB_PAT = ('\n::: cell\n'
@@ -48,6 +71,9 @@ _BACKTICK_SUB_PAT = ('\n::: cell\n'
                      r'\g<block>\g<endi>```'
                      '\n\n:::\n')
 
+# Strategies for copying documents; see ``clone_doc``.
+COPY_STRATEGIES = ('json', 'deepcopy', 'none')
+
 # Regular expression to identify code reading data.
 READ_RE = re.compile(
     r'''^\s*
@@ -61,11 +87,89 @@ READ_RE = re.compile(
     flags=re.MULTILINE | re.VERBOSE)
 
 
+# Panflute element types that can contain other elements.
+CONTAINER_TYPES = (
+    pf.Doc, pf.MetaMap, pf.MetaList, pf.MetaInlines, pf.MetaBlocks,
+    # Blocks.
+    pf.Plain, pf.Para, pf.LineBlock, pf.LineItem, pf.BlockQuote, pf.Header,
+    pf.Div, pf.Figure, pf.Caption, pf.BulletList, pf.OrderedList,
+    pf.ListItem, pf.DefinitionList, pf.DefinitionItem, pf.Definition,
+    pf.Table, pf.TableHead, pf.TableBody, pf.TableFoot, pf.TableRow,
+    pf.TableCell,
+    # Inlines.
+    pf.Emph, pf.Strong, pf.Underline, pf.Strikeout, pf.Superscript,
+    pf.Subscript, pf.SmallCaps, pf.Quoted, pf.Cite, pf.Citation, pf.Link,
+    pf.Image, pf.Note, pf.Span)
+
+
 class FilterError(ValueError):
     """ Exception for invalid values in filters
     """
 
 
+def pruned_walk(elem, action, doc, target_types, container_types):
+    """ Walk `elem` as for ``elem.walk(action, doc)``, pruning the walk
+
+    We only call `action` for elements of `target_types`, and only walk into
+    elements of `container_types`.  We only reset element children that the
+    walk changed.
+
+    Parameters
+    ----------
+    elem : :class:`pf.Element`
+        Element to walk.
+    action : callable
+        Callable accepting element and `doc`, returning None for no change, or
+        replacement element, or list of replacement elements.
+    doc : :class:`pf.Doc`
+        Document to pass to `action`.
+    target_types : tuple
+        Types of elements for which to call `action`.
+    container_types : tuple
+        Types of elements in which to search for elements of `target_types`.
+        The types should include all types that can contain (at any depth)
+        elements of `target_types`.
+
+    Returns
+    -------
+    altered : :class:`pf.Element` or list
+        `elem`, or value from `action` for `elem`, if not None.
+    """
+    if isinstance(elem, container_types):
+        for child_name in elem._children:
+            child = getattr(elem, child_name)
+            if isinstance(child, pf.ListContainer):
+                walked = []
+                for item in child:
+                    altered = pruned_walk(item, action, doc, target_types,
+                                          container_types)
+                    if altered is item:
+                        walked.append(item)
+                    elif type(altered) is list:
+                        walked += altered
+                    else:
+                        walked.append(altered)
+                if (len(walked) != len(child) or
+                    any(a is not b for a, b in zip(walked, child))):
+                    setattr(elem, child_name, walked)
+            elif isinstance(child, pf.DictContainer):
+                walked = [(k, pruned_walk(v, action, doc, target_types,
+                                          container_types))
+                          for k, v in child.items()]
+                if any(v is not child[k] for k, v in walked):
+                    setattr(elem, child_name,
+                            [(k, v) for k, v in walked if v != []])
+            elif isinstance(child, pf.Element):
+                altered = pruned_walk(child, action, doc, target_types,
+                                      container_types)
+                if altered is not child:
+                    setattr(elem, child_name, altered)
+    if isinstance(elem, target_types):
+        altered = action(elem, doc)
+        return elem if altered is None else altered
+    return elem
+
+
 class Filter:
     """ Class to contain standard functions for Panflute filter
 
@@ -81,8 +185,31 @@ class Filter:
     output, and implements a simple dropping of ``div``s or ``span``s with
     names specified somehow via the ``get_bad_names`` method.  Typically this
     will be via metadata in the document to be filtered.
+
+    When filtering Pandoc JSON from stdin, ``main`` defaults to the "raw"
+    engine, that drops elements from the decoded JSON dicts and lists, without
+    converting to and from Panflute objects.  The raw engine drops elements of
+    types in ``raw_types`` for which ``drop_raw`` returns True; subclasses
+    overriding ``action`` should also override these.  Set environment
+    variable ``NOTEOUT_FILTER_ENGINE=panflute`` to use the Panflute engine.
+
+    The Panflute engine only calls ``action`` for elements of
+    ``target_types``, and only walks into elements of ``container_types``
+    (see :func:`pruned_walk`).
     """
 
+    # Panflute element types for which to call ``action``.
+    target_types = (pf.Div, pf.Span)
+
+    # Panflute element types that can contain ``target_types``.
+    container_types = CONTAINER_TYPES
+
+    # Pandoc element types that ``drop_raw`` can drop.
+    raw_types = ('Div', 'Span')
+
+    # Engines for filtering Pandoc JSON input.
+    engines = ('raw', 'panflute')
+
     @classmethod
     def get_bad_names(cls, doc):
         """ Get class names for divs and spans to filter
@@ -102,16 +229,233 @@ class Filter:
             bad_names.intersection(elem.classes)):
             return []
 
+    @classmethod
+    def drop_raw(cls, node, bad_names):
+        """ True if we should drop Pandoc JSON element `node` of `raw_types`
+        """
+        return not bad_names.isdisjoint(node['c'][0][1])
+
     @classmethod
     def finalize(cls, doc):
         del doc.bad_names
 
     @classmethod
-    def main(cls, doc=None):
-        return pf.run_filter(cls.action,
-                             prepare=cls.prepare,
-                             finalize=cls.finalize,
-                             doc=doc)
+    def main(cls, doc=None, engine=None):
+        """ Run filter on `doc` or, if `doc` is None, on Pandoc JSON on stdin
+
+        Parameters
+        ----------
+        doc : None or :class:`pf.Doc`, optional
+            Document to filter.  If None, read from stdin, and write filtered
+            document to stdout.
+        engine : None or {'raw', 'panflute'}, optional
+            Engine to filter stdin.  None gives value of environment variable
+            ``NOTEOUT_FILTER_ENGINE``, or 'raw' if not set.  We always use the
+            Panflute engine for a `doc` argument.
+        """
+        if engine is None:
+            engine = os.environ.get('NOTEOUT_FILTER_ENGINE', 'raw')
+        if engine not in cls.engines:
+            raise FilterError(f'Filter engine should be one of {cls.engines}')
+        if doc is not None:
+            return cls.filter(doc)
+        if engine == 'panflute':
+            return pf.dump(cls.filter(pf.load()))
+        dump_raw(cls.filter_raw(load_raw()))
+
+    @classmethod
+    def filter(cls, doc):
+        """ Filter Panflute document `doc` in place, and return it
+        """
+        cls.prepare(doc)
+        doc = pruned_walk(doc, cls.action, doc, cls.target_types,
+                          cls.container_types)
+        cls.finalize(doc)
+        return doc
+
+    @classmethod
+    def filter_raw(cls, raw_doc):
+        """ Filter Pandoc JSON `raw_doc` in place, and return it
+
+        Parameters
+        ----------
+        raw_doc : dict
+            Pandoc document, as decoded from JSON.
+
+        Returns
+        -------
+        raw_doc : dict
+            Input `raw_doc`, with dropped elements removed.
+        """
+        doc = raw_meta_doc(raw_doc)
+        cls.prepare(doc)
+        if (bad_names := doc.bad_names):
+
+            def drop(node):
+                return (node.get('t') in cls.raw_types and
+                        cls.drop_raw(node, bad_names))
+
+            # Panflute filters walk the metadata as well as the blocks.
+            _drop_raw(raw_doc['meta'], drop)
+            _drop_raw(raw_doc['blocks'], drop)
+        cls.finalize(doc)
+        return raw_doc
+
+
+def _drop_raw(obj, drop):
+    """ Remove dicts in lists for which `drop` returns True, recursively
+    """
+    if isinstance(obj, dict):
+        obj = obj.values()
+    elif any(isinstance(v, dict) and drop(v) for v in obj):
+        obj[:] = [v for v in obj if not (isinstance(v, dict) and drop(v))]
+    for v in obj:
+        if isinstance(v, (list, dict)):
+            _drop_raw(v, drop)
+
+
+def load_raw(input_stream=None):
+    """ Load Pandoc JSON document as dicts and lists
+
+    Parameters
+    ----------
+    input_stream : None or file-like, optional
+        Stream from which to read JSON.  None means read bytes from stdin.
+
+    Returns
+    -------
+    raw_doc : dict
+        Decoded JSON.
+    """
+    return json.load(sys.stdin.buffer if input_stream is None
+                     else input_stream)
+
+
+def dump_raw(raw_doc, output_stream=None):
+    """ Write Pandoc JSON document `raw_doc`, as for ``pf.dump``
+
+    Parameters
+    ----------
+    raw_doc : dict
+        Pandoc document, as decoded from JSON.
+    output_stream : None or file-like, optional
+        Text stream to which to write JSON.  None means write UTF-8 bytes to
+        stdout.
+    """
+    content = json.dumps(raw_doc, separators=(',', ':'), ensure_ascii=False)
+    if output_stream is not None:
+        output_stream.write(content)
+        return
+    sys.stdout.flush()
+    sys.stdout.buffer.write(content.encode('utf-8'))
+    sys.stdout.buffer.flush()
+
+
+def raw_meta_doc(raw_doc):
+    """ Panflute document with metadata, but no blocks, from `raw_doc`
+
+    Parameters
+    ----------
+    raw_doc : dict
+        Pandoc document, as decoded from JSON.
+
+    Returns
+    -------
+    doc : :class:`pf.Doc`
+        Document with metadata from `raw_doc`, and format as for
+        ``pf.load``.
+    """
+    return json2doc(json.dumps({'pandoc-api-version':
+                                raw_doc['pandoc-api-version'],
+                                'meta': raw_doc['meta'],
+                                'blocks': []}))
+
+
+def json2doc(json_src):
+    """ Panflute document from Pandoc JSON `json_src`, as for ``pf.load``
+
+    Parameters
+    ----------
+    json_src : str or bytes
+        Pandoc JSON.
+
+    Returns
+    -------
+    doc : :class:`pf.Doc`
+        Document, with format from command line, as for ``pf.load``.
+    """
+    doc = json.loads(json_src, object_hook=pf.elements.from_json)
+    doc.format = sys.argv[1] if len(sys.argv) > 1 else 'html'
+    return doc
+
+
+_JSON_WS_RE = re.compile(r'[ \t\n\r]*')
+
+
+def load_raw_keys(json_src, keys):
+    """ Decode values for top-level `keys` of JSON object in `json_src`
+
+    We stop decoding when we have found all `keys`, so, for Pandoc JSON, where
+    ``meta`` comes before the (much larger) ``blocks``, we can decode the
+    metadata without decoding the blocks.
+
+    Parameters
+    ----------
+    json_src : str or bytes
+        JSON for object.
+    keys : sequence
+        Top-level keys for which to decode values.
+
+    Returns
+    -------
+    values : dict
+        Decoded values for keys in `keys`, where present in `json_src`.
+    """
+    if isinstance(json_src, bytes):
+        json_src = json_src.decode('utf-8')
+    decoder = json.JSONDecoder()
+    values, keys = {}, set(keys)
+
+    def skip(pos, chars):
+        pos = _JSON_WS_RE.match(json_src, pos).end()
+        if json_src[pos:pos + 1] not in chars:
+            raise ValueError(f'Expecting one of "{chars}" at {pos}')
+        return _JSON_WS_RE.match(json_src, pos + 1).end()
+
+    pos = skip(0, '{')
+    while keys and json_src[pos:pos + 1] == '"':
+        key, pos = decoder.raw_decode(json_src, pos)
+        value, pos = decoder.raw_decode(json_src, skip(pos, ':'))
+        if key in keys:
+            values[key] = value
+            keys.remove(key)
+        pos = skip(pos, ',}')
+    return values
+
+
+def pass_through(process, input_stream=None, output_stream=None):
+    """ Call `process` with Pandoc JSON bytes, write bytes unchanged to output
+
+    Use for filters that need to read, but not modify, the document.  We do not
+    walk or re-encode the document.
+
+    Parameters
+    ----------
+    process : callable
+        Callable accepting bytes of Pandoc JSON input.
+    input_stream : None or file-like, optional
+        Binary stream from which to read JSON.  None means stdin.
+    output_stream : None or file-like, optional
+        Binary stream to which to write JSON.  None means stdout.
+    """
+    in_bytes = (sys.stdin.buffer if input_stream is None
+                else input_stream).read()
+    process(in_bytes)
+    if output_stream is None:
+        sys.stdout.flush()
+        output_stream = sys.stdout.buffer
+    output_stream.write(in_bytes)
+    output_stream.flush()
 
 
 def quartoize(in_md):
@@ -138,7 +482,8 @@ def quartoize(in_md):
         :::
 
     This function does a version of preprocessing on Markdown text, so we can
-    get closer to Quarto parsing in our tests.
+    get closer to Quarto parsing, for tests, and for running documents through
+    Pandoc without Quarto (see :func:`fmt2fmt` with ``in_fmt='quarto-like'``).
 
     Parameters
     ----------
@@ -157,11 +502,153 @@ def quartoize(in_md):
     See `https://github.com/quarto-dev/quarto-cli/discussions/11393`_ for a
     discussion of Quarto vs Pandoc filtering.
 
-    You won't want to use this workaround in production, but you may want to
-    use it for tests.  For example, you can use it for simulating Quarto filter
-    input.
+    The output is the same as for substituting ``_BACKTICK_SUB_PAT`` for
+    matches of ``_BACKTICK_BLOCK_RE``, but we scan line by line, stop looking
+    for code block ends after the first search that fails, and cache the
+    search for the closing brace of block starts, so the time taken is linear
+    in the length of the input, even for unclosed blocks and block starts.
+    """
+    return ''.join(_quartoize_chunks(in_md))
+
+
+def _quartoize_chunks(in_md):
+    """ Generate output chunks for :func:`quartoize`
+
+    We check for a code block start at each line starting with backticks and
+    a brace, or at the start of the run of blank lines before such a line,
+    which is where ``_BACKTICK_BLOCK_RE`` would start its match.
+    """
+    starts = _BlockStarts(in_md)
+    # Start of output not yet generated.
+    pos = 0
+    # First line start at which a code block can begin.
+    scan_from = 0
+    # Start of first failed search for code block end; later searches for the
+    # end of a block can only succeed before this point.
+    fail_from = len(in_md) + 1
+    search_from = 0
+    while (line := _FENCE_LINE_RE.search(in_md, search_from)):
+        search_from = line.end()
+        m = starts.match(_blank_run_start(in_md, line.start(), scan_from))
+        if not m:
+            continue
+        start, end, starti, lang, lparams = m
+        if not (e := _find_block_end(in_md, end, fail_from)):
+            fail_from = min(fail_from, end)
+            continue
+        yield in_md[pos:start]
+        yield ('\n::: cell\n' +
+               f'{starti}```{{.{lang} .cell-code{lparams}}}' +
+               in_md[end:e.start()] +
+               f'{e["endi"]}```' +
+               '\n\n:::\n')
+        pos = e.end()
+        # Block end can finish at start of a blank line.
+        scan_from = search_from = (pos if in_md[pos - 1] == '\n'
+                                   else pos + 1)
+    yield in_md[pos:]
+
+
+class _BlockStarts:
+    """ Match code block starts in `in_md`, as for ``_BACKTICK_START_PAT``
+
+    The lazy DOTALL match for the block start parameters searches forward to
+    the next closing brace followed only by whitespace to the end of the line
+    (a valid closing brace), so matching the regular expression at each of
+    many unclosed starts takes quadratic time.  Instead, we cache the position
+    of the next valid closing brace, which only moves forward as the scan
+    advances.
+    """
+
+    def __init__(self, in_md):
+        self.in_md = in_md
+        # Position after which we searched for a valid closing brace, and the
+        # position of that brace, or None if none found.
+        self._close_cache = (len(in_md) + 1, None)
+        # Closing brace, and end of match after trailing whitespace.
+        self._end_cache = (None, None)
+
+    def match(self, pos):
+        """ Match code block start at `pos`, or None
+
+        Returns
+        -------
+        match : None or tuple
+            None if no code block start at `pos`, otherwise tuple of (start,
+            end, starti, lang, lparams), where `start` and `end` are the
+            positions of the start and end of the match, and other values are
+            the text matching the named groups of ``_BACKTICK_START_PAT``,
+            with `lparams` of '' where the group does not match.
+        """
+        in_md = self.in_md
+        if not (head := _BACKTICK_HEAD_RE.match(in_md, pos)):
+            return None
+        after = head.end()
+        if in_md[after:after + 1].isspace():
+            # Parameters run to first valid closing brace.
+            if (close := self._next_close(after + 1)) is None:
+                return None
+        elif _BACKTICK_CLOSE_RE.match(in_md, after):
+            close = after
+        else:
+            return None
+        return (pos, self._match_end(close), head['starti'], head['lang'],
+                in_md[after:close])
+
+    def _next_close(self, pos):
+        """ Position of first valid closing brace at or after `pos`, or None
+        """
+        from_pos, close = self._close_cache
+        if from_pos <= pos and (close is None or pos <= close):
+            return close
+        m = _BACKTICK_CLOSE_RE.search(self.in_md, pos)
+        close = m.start() if m else None
+        self._close_cache = (pos, close)
+        return close
+
+    def _match_end(self, close):
+        """ End of start match with valid closing brace at `close`
+
+        Trailing ``\\s*$`` takes all whitespace after the brace, back to the
+        last line end.
+        """
+        if self._end_cache[0] == close:
+            return self._end_cache[1]
+        in_md = self.in_md
+        ws_end = _WS_RE.match(in_md, close + 1).end()
+        end = (ws_end if ws_end == len(in_md) else
+               in_md.rfind('\n', close + 1, ws_end))
+        self._end_cache = (close, end)
+        return end
+
+
+def _blank_run_start(in_md, line_start, scan_from):
+    """ Start of run of blank lines before `line_start`, or `line_start`
+
+    Run cannot start before line start `scan_from`.
+    """
+    while line_start > scan_from:
+        prev_end = line_start - 1
+        prev_start = in_md.rfind('\n', scan_from, prev_end) + 1 or scan_from
+        if in_md[prev_start:prev_end].strip():
+            break
+        line_start = prev_start
+    return line_start
+
+
+def _find_block_end(in_md, start, fail_from):
+    """ Match for code block end after `start`, or None
+
+    Searching from `fail_from` has already failed, so only search before
+    `fail_from`.
     """
-    return _BACKTICK_BLOCK_RE.sub(_BACKTICK_SUB_PAT, in_md)
+    if start >= fail_from:
+        return None
+    if not (e := _BACKTICK_END_RE.search(in_md, start,
+                                         min(fail_from, len(in_md)))):
+        return None
+    # Match again without end limit, for full match of trailing whitespace.
+    return _BACKTICK_END_RE.match(in_md, e.start())
 
 
 def fmt2fmt(inp, in_fmt=None, out_fmt='gfm', standalone=True):
@@ -169,12 +656,14 @@ def fmt2fmt(inp, in_fmt=None, out_fmt='gfm', standalone=True):
 
     Parameters
     ----------
-    inp : :class:`pf.Element` or str
-        Input document as str or Panflute Doc or Element.
+    inp : :class:`pf.Element` or str or file-like
+        Input document as str or Panflute Doc or Element, or file-like object
+        from which to read str.
     in_fmt : None or str, optional
         Input format.  If `inp` is a Panflute Doc or Element, default (selected
         by None) corresponds to a Panflute object (via JSON), otherwise default
-        to `markdown`.
+        to `markdown`.  'quarto-like' means Markdown with Quarto code blocks,
+        preprocessed with :func:`quartoize`.
     in_fmt : str, optional
         Output format.
     standalone : {True, False}, optional
@@ -185,6 +674,8 @@ def fmt2fmt(inp, in_fmt=None, out_fmt='gfm', standalone=True):
     out : :class:`pf.Element` or str
         Output in Panflute or text format.
     """
+    if hasattr(inp, 'read'):
+        inp = inp.read()
     if in_fmt == 'quarto-like':
         inp = quartoize(inp)
         in_fmt = 'markdown'
@@ -196,7 +687,39 @@ def fmt2fmt(inp, in_fmt=None, out_fmt='gfm', standalone=True):
         standalone=standalone)
 
 
-def filter_doc(doc, filt_container):
+def clone_doc(doc, strategy='json'):
+    """ Return copy of Panflute document or element `doc`
+
+    Parameters
+    ----------
+    doc : :class:`pf.Element`
+        Input document Panflute Doc or Element.
+    strategy : {'json', 'deepcopy', 'none'}, optional
+        'json' copies via the Pandoc JSON for `doc`, and is much faster than
+        'deepcopy', but only copies values that Pandoc JSON stores, and the
+        document format.  'deepcopy' uses :func:`copy.deepcopy`, and so also
+        copies any other attributes of `doc` and its elements.  'none' returns
+        `doc` without copying.
+
+    Returns
+    -------
+    copied : :class:`pf.Element`
+        Copy of `doc`.
+    """
+    if strategy not in COPY_STRATEGIES:
+        raise ValueError(f'strategy should be one of {COPY_STRATEGIES}')
+    if strategy == 'none':
+        return doc
+    if strategy == 'deepcopy':
+        return deepcopy(doc)
+    copied = json.loads(json.dumps(doc.to_json()),
+                        object_hook=pf.elements.from_json)
+    if isinstance(doc, pf.Doc):
+        copied.format = doc.format
+    return copied
+
+
+def filter_doc(doc, filt_container, copy='json'):
     """ Filter Panflute document `doc` with filter defined in `filt_container`
 
     Parameters
@@ -206,13 +729,16 @@ def filter_doc(doc, filt_container):
     filt_container : object
         Object with `action` attribute, and (optionally) `prepare` and / or
         `finalize` attribute.
+    copy : {'json', 'deepcopy', 'none'}, optional
+        Strategy for copying `doc` before filtering; see :func:`clone_doc`.
+        'none' filters `doc` in place.
 
     Returns
     -------
     out_doc : :class:`pf.Element`
         Document filtered as specified by `filt_container`.
     """
-    copied = deepcopy(doc)
+    copied = clone_doc(doc, copy)
     pf.run_filter(filt_container.action,
                   prepare=getattr(filt_container, 'prepare', None),
                   finalize=getattr(filt_container, 'finalize', None),
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+""" Panflute filter to run filters named in ``noteout.post-chain``
+
+See ``chain.py`` for details.
+"""
+
+from noteout.chain import main as chain_main
+
+
+def main(doc=None):
+    return chain_main(doc, metadata_field='noteout.post-chain')
+
+
+if __name__ == "__main__":
+    main()
@@ -25,12 +25,75 @@ For the download notebooks:
 For the JupyterLite (JL) notebooks:
 
 * Create JL notebook output directory.
-* Copy all directories in input notebook directory to JL output directory.
+* Copy all directories in input notebook directory to JL output directory,
+  only copying files that have changed.  Quarto config options
+  ``processing.jl-copy-compare`` ('stat' or 'content'),
+  ``processing.jl-copy-link`` and ``processing.jl-copy-delete`` select the
+  comparison, hard-linking instead of copying, and deletion of output files
+  and directories no longer in the input directories.  Deletion leaves files
+  at the top level of the JL output directory, such as notebooks and
+  ``jupyter-lite.json``, hidden directories, and any contents index
+  directory.  See :func:`noteout.sync.sync_tree`.
 * Replace local kernel with JL kernel specified in metadata.
 * If url_data_root specified, replace local file with URL, add message.
 * Prefix any site URLs to be relative to the eventual JL output directory.
 * Write notebooks with extension given in Quarto config
   ``noteout.interact-nb-suffix``.
+
+The ``processing`` section of the Quarto config can be a list of JL targets,
+each with its own language, kernel, data root and JL output directory, given
+by ``jl-out-dir``.  ``jl-out-dir`` is relative to the JL output directory on
+the command line or, if not given, to the Quarto project directory.  We scan
+the HTML for cross-references and write the download notebooks once, and
+write JL notebooks for each target.
+
+Set ``jl-contents-index`` in a target to write a JupyterLite static contents
+index (``api/contents/.../all.json`` listings) for the target JL output
+directory.  A value of ``true`` writes the index to ``api/contents`` in the
+JL output directory; a string gives the index directory, relative to the JL
+output directory.  See :func:`noteout.jlcontents.write_contents_index`.
+
+Set ``interact-data-embed`` in a target to keep data reads as local paths,
+where the data file is at most ``interact-data-max-size`` bytes (no limit if
+not set), and make sure the data files are in the target JL output
+directory.  We still rewrite reads of larger files to read from
+``interact-data-root``, if set.
+
+Set ``noteout.dl-url-hash`` to ``name`` or ``query`` for cache-friendly
+download links.  For ``name``, we write a copy of each download notebook and
+zip with the start of the hash of its contents in the file name, as in
+``a_notebook.3f2a9c01b2e4.zip``.  For ``query``, we add the hash as a query
+to the download URL, as in ``a_notebook.zip?v=3f2a9c01b2e4``.  For zips, we
+hash the member names, CRCs and sizes, rather than the zip bytes, so zips
+rebuilt with the same contents, but different timestamps, keep their URL.  We
+write the mapping from the original to the hashed URLs to ``manifest.json`` in
+the notebook directory, and rewrite the ``notebook-link`` download links in
+the book HTML pages accordingly.
+
+For static hosting, ``--minify`` writes ipynb notebooks without indentation,
+``--strip-meta`` leaves out cell metadata recording execution and display
+state, and ``--gzip`` writes gzip-compressed copies of notebooks and
+``jupyter-lite.json``, with added ``.gz`` suffix.  We only write output files
+and their compressed copies if their contents have changed.
+
+With the ``--incremental`` flag, we record the inputs for each notebook in a
+state file ``.noteout/proc-state.json`` in the Quarto project directory, and
+only reprocess notebooks where the input notebook, its data files, the
+cross-references it uses, or the ``processing`` and ``noteout`` configuration
+have changed.  We also keep a copy of each input notebook in
+``.noteout/raw``, because processing overwrites the input notebook with the
+download version, and a copy of each download notebook in
+``.noteout/download``.  We save the cross-references from each HTML page in
+``.noteout/page-scans.json``, and only parse pages that have changed since the
+last run.  When Quarto rewrites an input notebook with unchanged contents, as
+it does for a full render, we restore the download notebook and zip from the
+copy, without reprocessing.
+
+With the ``--watch`` flag, we process incrementally, then poll the book HTML
+and notebook directories for changes, using ``inotify_simple``, if installed,
+to wake on changes.  When files change, we wait for changes to settle,
+re-scan changed HTML pages for cross-references, and reprocess notebooks with
+changed inputs.
 """
 
 """
@@ -142,18 +205,180 @@ HTML).
 """
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
-from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from copy import copy
 from functools import partial
+from gzip import compress as gz_compress
+import hashlib
+from html import unescape
+import json
+import os
 from pathlib import Path
 import re
-import shutil
+import struct
+import sys
+from threading import Lock
+import time
 from urllib.parse import urlparse
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo, ZIP64_LIMIT
 
-from bs4 import BeautifulSoup as BS
-import jupytext
 import yaml
 
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+from noteout.jlcontents import write_contents_index
+from noteout.nbio import nb2bytes, nb_fmt, read_nb
+from noteout.sync import prune_dirs, sync_file, sync_tree, write_changed
+
+
+class NBProcessError(RuntimeError):
+    """ Exception for failures processing one or more notebooks
+
+    Attribute ``errors`` is a list of ``(label, exception)`` tuples, one per
+    failure.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        msgs = '\n'.join(f'{label}: {e!r}' for label, e in errors)
+        super().__init__(f'Errors for {len(errors)} item(s):\n{msgs}')
+
+
+def _hash(content):
+    return hashlib.sha256(content).hexdigest()
+
+
+def _zip_hash(path):
+    """ Hash of member names, CRCs and sizes for zip file at `path`
+    """
+    with ZipFile(path) as zf:
+        members = sorted((info.filename, info.CRC, info.file_size)
+                         for info in zf.infolist())
+    return _hash(json.dumps(members).encode('utf-8'))
+
+
+def _file_hash(path):
+    """ Hash of contents of file at `path`, or None if file does not exist
+    """
+    try:
+        return _hash(Path(path).read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def rezip(zf_path, members):
+    """ Replace `members` in zip file `zf_path`
+
+    We copy the compressed data for other members from the original zip file,
+    without decompressing and recompressing, unless there is a file on disk
+    for that member with different size or modification time, in which case
+    we add the file from disk.
+
+    Parameters
+    ----------
+    zf_path : str or :class:`Path`
+        Path to zip file.  Member names are paths relative to the directory
+        containing the zip file.
+    members : dict
+        Mapping of member name to new contents (bytes) of member.  We ignore
+        names that are not already members.
+    """
+    zf_path = Path(zf_path)
+    tmp_path = zf_path.with_name(zf_path.name + '.tmp')
+    with ZipFile(zf_path) as zin, ZipFile(tmp_path, 'w') as zout:
+        for info in zin.infolist():
+            name = info.filename
+            disk_path = zf_path.parent / name
+            if name in members:
+                # Keep timestamp, so same contents give same zip.
+                out_info = ZipInfo(name, info.date_time)
+                out_info.compress_type = info.compress_type
+                out_info.external_attr = info.external_attr
+                zout.writestr(out_info, members[name])
+            elif _zip_member_stale(info, disk_path):
+                zout.write(disk_path, name, compress_type=info.compress_type)
+            elif (info.flag_bits & 0x01 or max(
+                    info.file_size, info.compress_size) >= ZIP64_LIMIT or
+                  not _can_copy_raw(zin, zout)):
+                # Encrypted or large file, or zipfile internals have changed;
+                # copy via zipfile.
+                zout.writestr(info, zin.read(info))
+            else:
+                _copy_zip_member(zin, zout, info)
+    os.replace(tmp_path, zf_path)
+
+
+def _zip_member_stale(info, disk_path):
+    """ True if file at `disk_path` differs in size or mtime from `info`
+    """
+    if info.is_dir():
+        return False
+    try:
+        st = disk_path.stat()
+    except FileNotFoundError:
+        return False
+    # Zip times are local, with two second resolution.
+    zip_mtime = time.mktime(info.date_time + (0, 0, -1))
+    return st.st_size != info.file_size or abs(st.st_mtime - zip_mtime) >= 2
+
+
+# ZipFile internals used by _copy_zip_member.
+_ZIP_WRITE_ATTRS = ('fp', 'start_dir', 'filelist', 'NameToInfo', '_didModify')
+
+
+def _can_copy_raw(zin, zout):
+    """ True if ZipFile internals needed for :func:`_copy_zip_member` exist
+    """
+    return (hasattr(zin, 'fp') and hasattr(ZipInfo, 'FileHeader') and
+            all(hasattr(zout, attr) for attr in _ZIP_WRITE_ATTRS))
+
+
+def _copy_zip_member(zin, zout, info):
+    """ Copy compressed data for member `info` from `zin` to `zout`
+
+    This uses ZipFile internals; check with :func:`_can_copy_raw` first.
+    """
+    zin.fp.seek(info.header_offset)
+    header = zin.fp.read(30)
+    # Data starts after local file header, file name and extra field.
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    zin.fp.seek(info.header_offset + 30 + name_len + extra_len)
+    out_info = copy(info)
+    # We write sizes and CRC in header, not in trailing data descriptor.
+    out_info.flag_bits &= ~0x08
+    out_info.header_offset = zout.start_dir
+    zout.fp.seek(zout.start_dir)
+    zout.fp.write(out_info.FileHeader(zip64=False))
+    remaining = info.compress_size
+    while remaining:
+        chunk = zin.fp.read(min(remaining, 1 << 20))
+        if not chunk:
+            raise ValueError(f'Truncated data for {info.filename} in zip')
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+    zout.start_dir = zout.fp.tell()
+    zout.filelist.append(out_info)
+    zout.NameToInfo[out_info.filename] = out_info
+    zout._didModify = True
+
+
+def _outcome(func, item):
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+
+def _escape_attr(value):
+    """ Escape `value` for HTML attribute, as for BeautifulSoup output
+    """
+    return (value.replace('&', '&amp;')
+            .replace('<', '&lt;')
+            .replace('>', '&gt;'))
+
 
 def cell_gen(nb, ctype):
     """ Generator for notebook cells
@@ -163,6 +388,66 @@ def cell_gen(nb, ctype):
             yield cell
 
 
+def copy_nb(nb):
+    """ Copy notebook `nb` for processing
+
+    The copy has its own metadata dictionary and list of cells, but shares the
+    cells themselves with `nb`.  Processing functions may modify the metadata
+    and the list of cells of the copy, but should replace, rather than modify,
+    the cells (see :func:`replace_sources`).  This avoids copying cell outputs,
+    which may be large.
+    """
+    out = copy(nb)
+    out['metadata'] = copy(nb['metadata'])
+    out['cells'] = list(nb['cells'])
+    return out
+
+
+def replace_sources(nb, ctype, func):
+    """ Replace source of each `ctype` cell in `nb` with ``func(source)``
+
+    Copies (and replaces) only those cells where the source changes.
+    """
+    cells = nb['cells']
+    for i, cell in enumerate(cells):
+        if cell['cell_type'] != ctype:
+            continue
+        if (source := func(cell['source'])) != cell['source']:
+            cells[i] = _with_source(cell, source)
+    return nb
+
+
+def _with_source(cell, source):
+    out = copy(cell)
+    out['source'] = source
+    return out
+
+
+class JLTarget:
+    """ JupyterLite output target
+
+    Parameters
+    ----------
+    proc_config : dict
+        Configuration for target, from ``processing`` section of Quarto
+        config.
+    jl_out_path : str or :class:`Path`
+        Output directory for JupyterLite notebooks.
+    read_re : :class:`re.Pattern`
+        Regular expression to find data reads in notebook code.
+    """
+
+    def __init__(self, proc_config, jl_out_path, read_re):
+        self.config = proc_config
+        self.jl_out_path = Path(jl_out_path)
+        self.language = proc_config['language']
+        self.read_re = read_re
+        self.sync_opts = {
+            'compare': proc_config.get('jl-copy-compare', 'stat'),
+            'link': proc_config.get('jl-copy-link', False),
+            'delete': proc_config.get('jl-copy-delete', False)}
+
+
 class NBProcessor:
 
     _JL_JSON_FMT = r'''\
@@ -198,92 +483,422 @@ class NBProcessor:
     # Attributes to search for in HTML for Quarto cross-ref.
     xref_attrs = {'class': 'quarto-xref'}
 
-    def __init__(self, quarto_config, jl_out_path):
+    # Engines for rewriting cross-references in notebook Markdown.
+    xref_engines = ('soup', 'regex')
+
+    # Modes for content-hashed download URLs.
+    dl_hash_modes = ('name', 'query')
+
+    # Number of hash hex digits for download URLs.
+    _DL_HASH_LEN = 12
+
+    # Download link, as written by mark_notebooks.
+    _DL_LINK_RE = re.compile(
+        r'(<a\s[^>]*?class="notebook-link"[^>]*?href=")([^"]*)(")')
+
+    # Hash in download file name.
+    _DL_HASHED_RE = re.compile(
+        r'\.[0-9a-f]{%d}(?=\.[^./?]+$)' % _DL_HASH_LEN)
+
+    # Opening and closing tags for HTML anchor, for regex engine.  Quoted
+    # attribute values can contain '>'.  No part of the tag can contain '<',
+    # so each search stops at the next '<', and the search is linear time.
+    _A_OPEN_RE = re.compile(r"""<a\s(?:[^<>"']|"[^<"]*"|'[^<']*')*>""",
+                            flags=re.IGNORECASE)
+    _A_CLOSE_RE = re.compile(r'</a\s*>', flags=re.IGNORECASE)
+
+    # Attribute within HTML tag, for regex engine.
+    _ATTR_RE = re.compile(
+        r'''(?P<name>[^\s"'>/=]+)
+        (?:\s*=\s*
+        (?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<uq>[^\s"'=<>`]+)))?
+        ''',
+        flags=re.VERBOSE)
+
+    # Anchor reference within HTML tag.
+    _HREF_KEY_RE = re.compile(r'''href\s*=\s*["']?(#[^"'\s>]+)''',
+                              flags=re.IGNORECASE)
+
+    # Version of incremental state file format.
+    _STATE_VERSION = 1
+
+    def __init__(self, quarto_config, jl_out_path=None, xref_engine='soup',
+                 jobs=1, minify=False, incremental=False, strip_meta=False,
+                 gzip=False):
+        if xref_engine not in self.xref_engines:
+            raise ValueError(
+                f'xref_engine should be one of {self.xref_engines}')
+        self.xref_engine = xref_engine
+        self.jobs = os.cpu_count() if jobs in (None, 0) else jobs
+        self.minify = minify
+        self.strip_meta = strip_meta
+        self.gzip = gzip
+        self.incremental = incremental
         self.quarto_config = Path(quarto_config)
-        self.jl_out_path = Path(jl_out_path)
         self.source_path = self.quarto_config.parent
         self.quarto_vars = yaml.safe_load(self.quarto_config.read_text())
         self._noteout_config = self.quarto_vars['noteout']
         if 'processing' not in self.quarto_vars:
             raise ValueError('Need "processing" section in _quarto.yml')
-        self._proc_config = self.quarto_vars['processing']
+        self.targets = self._get_targets(self.quarto_vars['processing'],
+                                         jl_out_path)
+        # Configuration of first target, as for single target.
+        self._proc_config = self.targets[0].config
+        self.jl_out_path = self.targets[0].jl_out_path
+        self.language = self.targets[0].language
         self.book_path = self.source_path.joinpath(
             self.quarto_vars['project'].get('output-dir', '_book'))
         self._nb_in_path = self.book_path / self._noteout_config['nb-dir']
         self._nb_in_suffix='.' + self._noteout_config['nb-format']
-        self.language = self._proc_config['language']
-        self._nb_regex = (self.PY_READ_RE if self.language == 'python' else
-                          self.R_READ_RE)
+        self._dl_hash = self._noteout_config.get('dl-url-hash')
+        if self._dl_hash not in (None, *self.dl_hash_modes):
+            raise ValueError(
+                f'noteout.dl-url-hash should be one of {self.dl_hash_modes}')
         self._jl_out_suffix = self._noteout_config .get('interact-nb-suffix',
                                                          self._nb_in_suffix)
         self._xrefs = None
-
-    def _copy_in_dirs(self, out_path):
+        self._xref_parts_cache = None
+        self._page_scans = {}
+        self._saved_scans = None
+        self._state = None
+        self._embed_lock = Lock()
+        self.state_path = self.source_path / '.noteout' / 'proc-state.json'
+        self._raw_path = self.state_path.parent / 'raw'
+        self._dl_cache_path = self.state_path.parent / 'download'
+        self._scans_path = self.state_path.parent / 'page-scans.json'
+
+    def _get_targets(self, proc_configs, jl_out_path):
+        """ JupyterLite targets from ``processing`` config `proc_configs`
+        """
+        if isinstance(proc_configs, dict):
+            proc_configs = [proc_configs]
+        if not proc_configs:
+            raise ValueError('Need at least one target in "processing"')
+        targets = []
+        for proc_config in proc_configs:
+            if 'jl-out-dir' in proc_config:
+                out_root = (self.source_path if jl_out_path is None
+                            else Path(jl_out_path))
+                out_path = out_root / proc_config['jl-out-dir']
+            elif jl_out_path is None or len(proc_configs) > 1:
+                raise ValueError(
+                    'Need "jl-out-dir" for each target in "processing", or '
+                    'JupyterLite output directory for single target')
+            else:
+                out_path = jl_out_path
+            read_re = (self.PY_READ_RE if proc_config['language'] == 'python'
+                       else self.R_READ_RE)
+            targets.append(JLTarget(proc_config, out_path, read_re))
+        out_paths = [t.jl_out_path.resolve() for t in targets]
+        if len(set(out_paths)) < len(out_paths):
+            raise ValueError('"processing" targets have same output directory')
+        return targets
+
+    def _copy_in_dirs(self, target):
+        out_path = target.jl_out_path
         out_path.mkdir(exist_ok=True, parents=True)
+        in_names = set()
         for path in self._nb_in_path.glob('*'):
             if path.is_dir():
-                shutil.copytree(path, out_path / path.name, dirs_exist_ok=True)
+                in_names.add(path.name)
+                sync_tree(path, out_path / path.name, **target.sync_opts)
+        if target.sync_opts['delete']:
+            keep = in_names | {p.name for p in out_path.glob('.*')}
+            if (index_dir := self._index_top_dir(target)):
+                keep.add(index_dir)
+            prune_dirs(out_path, keep)
+
+    def _index_top_dir(self, target):
+        """ Top-level directory in JL output containing contents index, or None
+        """
+        if not (index := target.config.get('jl-contents-index')):
+            return None
+        out_path = target.jl_out_path.resolve()
+        index_path = out_path / ('api/contents' if index is True else index)
+        try:
+            return index_path.resolve().relative_to(out_path).parts[0]
+        except (ValueError, IndexError):  # Outside, or same as, output.
+            return None
+
+    def _map(self, func, items, label=str):
+        """ Apply `func` to each of `items`, using `jobs` threads
+
+        Parameters
+        ----------
+        func : callable
+            Function accepting single item from `items`.
+        items : iterable
+            Items to process.
+        label : callable, optional
+            Function returning label for item, for error messages.
+
+        Returns
+        -------
+        results : list
+            Results of `func` for each item in `items`, in order of `items`.
+
+        Raises
+        ------
+        NBProcessError
+            If `func` raised an exception for any item.  We raise after
+            processing all items, and the error lists all failures.
+        """
+        items = list(items)
+        if self.jobs == 1 or len(items) < 2:
+            outcomes = [_outcome(func, item) for item in items]
+        else:
+            with ThreadPoolExecutor(self.jobs) as executor:
+                outcomes = list(executor.map(partial(_outcome, func), items))
+        if (errors := [(label(item), e) for item, (r, e) in
+                       zip(items, outcomes) if e is not None]):
+            raise NBProcessError(errors)
+        return [r for r, e in outcomes]
+
+    def _nb_paths(self):
+        paths = self._nb_in_path.glob('*' + self._nb_in_suffix)
+        if self._dl_hash == 'name':  # Drop hashed copies.
+            paths = (p for p in paths if not self._DL_HASHED_RE.search(p.name))
+        return sorted(paths)
 
     def read_nbs(self):
-        nbs_out = []
-        for path in self._nb_in_path.glob('*' + self._nb_in_suffix):
-            nb = jupytext.read(path)
-            nbs_out.append((path, nb))
-        return nbs_out
-
-    def _process_nbs(self, nbs_in, funcs):
-        nbs_out = []
-        for path, nb in nbs_in:
-            for func in funcs:
-                nb = func(deepcopy(nb))
-            nbs_out.append((path, nb))
-        return nbs_out
-
-    def _write_nbs(self, nbs_out, out_path, out_suffix):
-        for nb_path, nb in nbs_out:
-            out_root = out_path / nb_path.stem
-            jupytext.write(nb, out_root.with_suffix(out_suffix))
-
-    def _rezip_zips(self, out_path):
-        for zf_path in out_path.glob('*.zip'):
-            self._rezip_zip(zf_path)
-
-    def _rezip_zip(self, zf_path):
-        zf_dir = zf_path.parent
-        with ZipFile(zf_path, 'r') as zf:
-            paths = zf.namelist()
-        with ZipFile(zf_path, "w") as zf:
-            for path in paths:
-                zf.write(zf_dir / path, path)
-
-    def fix_kernels(self, nb):
+        paths = self._nb_paths()
+        return list(zip(paths, self._map(read_nb, paths)))
+
+    def fix_kernels(self, nb, target=None):
+        config = (self.targets[0] if target is None else target).config
         nb['metadata']['kernelspec'] = {
-            'name': self._proc_config['kernel-name'],
-            'display_name': self._proc_config['kernel-display']}
+            'name': config['kernel-name'],
+            'display_name': config['kernel-display']}
         return nb
 
-    def fix_data_source(self, nb):
-        url_data_root = self._proc_config.get('interact-data-root', None)
+    def fix_data_source(self, nb, target=None):
+        target = self.targets[0] if target is None else target
+        url_data_root = target.config.get('interact-data-root', None)
+        keep = None
+        if target.config.get('interact-data-embed'):
+            keep = partial(self._embed_data, target=target)
+            if not url_data_root:  # Embed all data files.
+                for cell in cell_gen(nb, 'code'):
+                    for m in target.read_re.finditer(cell['source']):
+                        keep(m['fname'])
         if url_data_root:
-            nb = self._path_to_url(nb, url_data_root)
+            nb = self._path_to_url(nb, url_data_root, target.read_re, keep)
         return nb
 
+    def _embed_data(self, fname, target):
+        """ Put data file `fname` into JL output for `target`, if allowed
+
+        Parameters
+        ----------
+        fname : str
+            Data file path, relative to notebook directory.
+        target : :class:`JLTarget`
+
+        Returns
+        -------
+        embedded : bool
+            True if data file is in JL output, at the same relative path.
+        """
+        rel_path = Path(fname)
+        if rel_path.is_absolute() or '..' in rel_path.parts:
+            return False
+        src_path = self._nb_in_path / rel_path
+        max_size = target.config.get('interact-data-max-size')
+        try:
+            if max_size is not None and src_path.stat().st_size > max_size:
+                return False
+        except FileNotFoundError:
+            return False
+        out_path = target.jl_out_path / rel_path
+        with self._embed_lock:  # Notebooks can share data files.
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            sync_file(src_path, out_path, target.sync_opts['compare'],
+                      target.sync_opts['link'])
+        return True
+
     def fix_xrefs(self, nb):
-        for cell in cell_gen(nb, 'markdown'):
-            src_soup = self._get_soup(cell['source'])
-            for sxr in self._get_xrefs(src_soup):
-                if (matching_xr := self.xrefs.get(sxr['href'])):
-                    sxr.replace_with(matching_xr)
-            cell['source'] = str(src_soup)
-        return nb
+        return replace_sources(
+            nb, 'markdown', lambda src: self.xref_sources(src)[0])
 
     def prefix_xref(self, nb, prefix):
-        for cell in cell_gen(nb, 'markdown'):
-            src_soup = self._get_soup(cell['source'])
+        return replace_sources(
+            nb, 'markdown',
+            lambda src: self.xref_sources(src, (prefix,), resolve=False)[1])
+
+    def xref_variants(self, nb, prefixes=()):
+        """ Notebooks with resolved, and resolved + prefixed cross-references
+
+        Parameters
+        ----------
+        nb : dict
+            Notebook with unresolved cross-references.
+        prefixes : sequence of str, optional
+            Prefixes for cross-reference hrefs, one output notebook per prefix.
+
+        Returns
+        -------
+        nbs : list
+            Notebook with resolved cross-references, followed by one notebook
+            for each prefix in `prefixes`, with resolved cross-references
+            prefixed by that prefix.  Each notebook is a copy from
+            :func:`copy_nb`, sharing unchanged cells with `nb`.
+        """
+        nbs = [copy_nb(nb) for i in range(len(prefixes) + 1)]
+        for i, cell in enumerate(nb['cells']):
+            if cell['cell_type'] != 'markdown':
+                continue
+            sources = self.xref_sources(cell['source'], prefixes)
+            for out_nb, source in zip(nbs, sources):
+                if source != cell['source']:
+                    out_nb['cells'][i] = _with_source(cell, source)
+        return nbs
+
+    def xref_sources(self, source, prefixes=(), resolve=True):
+        """ Resolve, prefix cross-references in Markdown `source`
+
+        Parses `source` once, at most, to generate all output variants.
+
+        Parameters
+        ----------
+        source : str
+            Markdown source for notebook cell.
+        prefixes : sequence of str, optional
+            Prefixes for cross-reference hrefs, one output variant per prefix.
+        resolve : {True, False}, optional
+            If True, replace cross-references with matching cross-references
+            in `xrefs`.
+
+        Returns
+        -------
+        sources : list
+            `source` with resolved cross-references, followed by one source for
+            each prefix in `prefixes`, with resolved cross-references prefixed
+            by that prefix.
+        """
+        if not self._has_xref(source):
+            return [source] * (len(prefixes) + 1)
+        if self.xref_engine == 'regex':
+            return self._re_xref_sources(source, prefixes, resolve)
+        return self._soup_xref_sources(source, prefixes, resolve)
+
+    def _soup_xref_sources(self, source, prefixes, resolve):
+        src_soup = self._get_soup(source)
+        if resolve:
             for sxr in self._get_xrefs(src_soup):
-                sxr['href'] = f"{prefix}{sxr['href']}"
-            cell['source'] = str(src_soup)
-        return nb
+                if (matching_xr := self.xrefs.get(sxr['href'])):
+                    # Copy, because we may use the same xref more than once.
+                    sxr.replace_with(copy(matching_xr))
+        sxrs = self._get_xrefs(src_soup)
+        hrefs = [sxr['href'] for sxr in sxrs]
+        sources = [str(src_soup)]
+        for prefix in prefixes:
+            for sxr, href in zip(sxrs, hrefs):
+                sxr['href'] = f"{prefix}{href}"
+            sources.append(str(src_soup))
+        return sources
+
+    def _re_xref_sources(self, source, prefixes, resolve):
+        parts, href_indices = self._re_xref_parts(source, resolve)
+        sources = [''.join(parts)]
+        for prefix in prefixes:
+            prefix = _escape_attr(prefix)
+            prefixed = list(parts)
+            for i in href_indices:
+                prefixed[i] = prefix + prefixed[i]
+            sources.append(''.join(prefixed))
+        return sources
+
+    def _re_xref_parts(self, source, resolve=True):
+        """ Split `source` into text and cross-reference hrefs
+
+        Only rewrites the spans of cross-references, leaving other text
+        unchanged.  Runs in linear time over `source`.
+
+        Parameters
+        ----------
+        source : str
+            HTML / Markdown text.
+        resolve : {True, False}, optional
+            If True, replace cross-references with the text of any matching
+            cross-reference in `xrefs`.
+
+        Returns
+        -------
+        parts : list
+            List of str, such that ``''.join(parts)`` is the (maybe resolved)
+            source text.
+        href_indices : list
+            Indices into `parts` of cross-reference href values.
+        """
+        parts = []
+        href_indices = []
+        last = 0
+        for m in self._A_OPEN_RE.finditer(source):
+            if m.start() < last:  # Inside replaced cross-reference.
+                continue
+            if (href_span := self._re_xref_href_span(m)) is None:
+                continue
+            href = unescape(source[slice(*href_span)])
+            if resolve and (xr_parts := self._xref_parts.get(href)):
+                parts.append(source[last:m.start()])
+                xr_text, xr_href_indices = xr_parts
+                href_indices += [len(parts) + i for i in xr_href_indices]
+                parts += xr_text
+                # Unclosed anchor runs to end of source, as for HTML parser.
+                close = self._A_CLOSE_RE.search(source, m.end())
+                last = close.end() if close else len(source)
+                continue
+            parts.append(source[last:href_span[0]])
+            href_indices.append(len(parts))
+            parts.append(source[slice(*href_span)])
+            last = href_span[1]
+        parts.append(source[last:])
+        return parts, href_indices
+
+    def _re_xref_href_span(self, a_match):
+        """ Span of href value for cross-reference open tag, or None
+        """
+        href_span = None
+        is_xref = False
+        start = a_match.start()
+        for am in self._ATTR_RE.finditer(a_match.group(), 2):
+            name = am['name'].lower()
+            value_group = next(
+                (g for g in ('dq', 'sq', 'uq') if am[g] is not None), None)
+            if name == 'href' and value_group:
+                href_span = tuple(start + i for i in am.span(value_group))
+            elif name == 'class' and value_group:
+                is_xref = self.xref_attrs['class'] in am[value_group].split()
+        return href_span if is_xref else None
+
+    @property
+    def _xref_parts(self):
+        """ Text and href indices for each cross-reference in `xrefs`
+        """
+        if self._xref_parts_cache is None:
+            self._xref_parts_cache = {
+                key: self._re_xref_parts(str(xr), resolve=False)
+                for key, xr in self.xrefs.items()}
+        return self._xref_parts_cache
+
+    def _prepare_xrefs(self):
+        # Build cross-reference tables before any threaded processing.
+        self.xrefs
+        if self.xref_engine == 'regex':
+            self._xref_parts
+
+    def refresh_xrefs(self):
+        """ Discard cross-reference tables, to rebuild from changed HTML
+
+        Next use of cross-references re-scans HTML pages that have changed
+        since the last scan.
+        """
+        self._xrefs = None
+        self._xref_parts_cache = None
+
+    def _has_xref(self, source):
+        # Cheap check to avoid parsing sources without cross-references.
+        return self.xref_attrs['class'] in source
 
     @property
     def xrefs(self):
@@ -305,13 +920,12 @@ class NBProcessor:
         all_xrefs = {}
         page_xrefs = []
         page_ids = {}
+        page_scans = {}
         for page_path in self.book_path.glob(self.html_globber):
-            from_root = page_path.relative_to(self.book_path)
-            soup = self._get_soup(page_path.read_text())
-            xrefs = self._get_xrefs(soup)
-            if (page_id := self._get_page_id(soup)):
-                page_ids[str(from_root)] = page_id
-            for xr in self._relativize_xrefs(xrefs, from_root):
+            page_id, xrefs = page_scans[page_path] = self._scan_page(page_path)
+            if page_id:
+                page_ids[str(page_path.relative_to(self.book_path))] = page_id
+            for xr in xrefs:
                 if '#' in xr['href']:
                     key = '#' + xr['href'].split('#')[1]
                     all_xrefs[key] = xr
@@ -321,8 +935,74 @@ class NBProcessor:
         for xr in page_xrefs:
             page_id = page_ids[xr['href']]
             all_xrefs['#' + page_id] = xr
+        self._page_scans = {path: (self._page_scans[path][0], scan)
+                            for path, scan in page_scans.items()}
+        if self.incremental:
+            self._write_scans()
         return all_xrefs
 
+    def _scan_page(self, page_path):
+        """ Page id and cross-references for HTML page at `page_path`
+
+        Reuses the previous scan of the page, if the page file has the same
+        modification time and size.  For incremental processing, previous
+        scans include those saved by earlier runs.
+
+        Returns
+        -------
+        page_id : None or str
+            Id of page title, if present.
+        xrefs : list
+            List of cross-reference a href tags, relative to book root.
+        """
+        stat = page_path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if (scan := self._page_scans.get(page_path)) and scan[0] == stamp:
+            return scan[1]
+        rel_path = page_path.relative_to(self.book_path)
+        saved = self._read_scans().get(rel_path.as_posix())
+        if saved and tuple(saved['stamp']) == stamp:
+            scan = saved['page_id'], [copy(self._get_soup(xr).a)
+                                      for xr in saved['xrefs']]
+            self._page_scans[page_path] = (stamp, scan)
+            return scan
+        soup = self._get_soup(page_path.read_text())
+        xrefs = self._relativize_xrefs(self._get_xrefs(soup), rel_path)
+        # Copy tags to release page parse tree.
+        scan = self._get_page_id(soup), [copy(xr) for xr in xrefs]
+        self._page_scans[page_path] = (stamp, scan)
+        return scan
+
+    def _read_scans(self):
+        """ Page scans from previous incremental run, or empty dict
+        """
+        if self._saved_scans is None:
+            self._saved_scans = {}
+            if self.incremental:
+                try:
+                    saved = json.loads(self._scans_path.read_text())
+                except (FileNotFoundError, ValueError):
+                    saved = {}
+                if (saved.get('version') == self._STATE_VERSION and
+                    saved.get('xref_attrs') == self.xref_attrs):
+                    self._saved_scans = saved['pages']
+        return self._saved_scans
+
+    def _write_scans(self):
+        """ Write page scans for reuse by later incremental runs
+        """
+        pages = {
+            path.relative_to(self.book_path).as_posix():
+            {'stamp': list(stamp),
+             'page_id': page_id,
+             'xrefs': [str(xr) for xr in xrefs]}
+            for path, (stamp, (page_id, xrefs)) in self._page_scans.items()}
+        self._saved_scans = pages
+        write_changed(self._scans_path, json.dumps(
+            {'version': self._STATE_VERSION,
+             'xref_attrs': self.xref_attrs,
+             'pages': pages}, sort_keys=True).encode('utf-8'))
+
     def _get_page_id(self, soup):
         sec_tag = soup.find(
             'span',
@@ -352,15 +1032,19 @@ class NBProcessor:
         return xrefs
 
     def _get_soup(self, html_text):
+        # Import on use; BeautifulSoup is slow to import.
+        from bs4 import BeautifulSoup as BS
         return BS(html_text, 'html.parser')
 
     def _get_xrefs(self, soup):
         return soup.find_all( 'a', attrs=self.xref_attrs)
 
-    def _path_to_url(self, nb, root_url):
-        out_nb = deepcopy(nb)
+    def _path_to_url(self, nb, root_url, read_re=None, keep=None):
+        read_re = self.targets[0].read_re if read_re is None else read_re
 
         def _read_re_replace(m):
+            if keep is not None and keep(m['fname']):
+                return m.group()
             d = m.groupdict()
             d['fname'] = Path(d['fname']).name
             return ('''\
@@ -369,38 +1053,417 @@ class NBProcessor:
 {indent}{equals}{read_func}{root_url}/{fname}{closequote}'''
                 .format(**d, root_url=root_url))
 
-        for cell in cell_gen(out_nb, 'code'):
-            cell['source'] = self._nb_regex.sub(
-                _read_re_replace, cell['source'])
-        return out_nb
+        return replace_sources(
+            nb, 'code', lambda src: read_re.sub(_read_re_replace, src))
 
     def _book_base(self):
         book_path = urlparse(self._noteout_config['book-url-root']).path
         return '/' + book_path.lstrip('/')
 
     def process(self):
-        fixed_nbs = self._process_nbs(self.read_nbs(), (self.fix_xrefs,))
-        self._write_downloads(fixed_nbs)
-        self._write_jls(fixed_nbs)
-
-    def _write_downloads(self, fixed_nbs):
-        dl_prefix = self._noteout_config['book-url-root'] + '/'
-        dl_nbs = self._process_nbs(
-            fixed_nbs,
-            (partial(self.prefix_xref, prefix=dl_prefix),))
-        self._write_nbs(dl_nbs, self._nb_in_path, self._nb_in_suffix)
-        self._rezip_zips(self._nb_in_path)
-
-    def _write_jls(self, fixed_nbs):
-        self._copy_in_dirs(self.jl_out_path)
-        jl_prefix = self._book_base() + '/'
-        jl_nbs = self._process_nbs(fixed_nbs, (
-            self.fix_kernels,
-            self.fix_data_source,
-            partial(self.prefix_xref, prefix=jl_prefix)))
-        self._write_nbs(jl_nbs, self.jl_out_path, self._jl_out_suffix)
-        (self.jl_out_path / 'jupyter-lite.json').write_text(
-            self._JL_JSON_FMT.format(**self._proc_config))
+        """ Write download and JupyterLite versions of all notebooks
+
+        Each notebook passes through reading, fixing, and writing of the
+        download and JupyterLite versions, and is then released, so we only
+        hold `jobs` notebooks in memory at any one time.
+        """
+        self._prepare_xrefs()
+        self._prepare_jl()
+        if self.incremental:
+            n_processed = self._process_incremental()
+        else:
+            nb_paths = self._nb_paths()
+
+            def process_nb_path(nb_path):
+                # Drop download contents; only hold notebooks in process.
+                self.process_nb_path(nb_path)
+
+            self._map(process_nb_path, nb_paths)
+            n_processed = len(nb_paths)
+        self._finish_jl()
+        if self._dl_hash:
+            self._hash_downloads()
+        return n_processed
+
+    def process_nb_path(self, nb_path, nb=None):
+        """ Write download and JupyterLite versions of notebook at `nb_path`
+
+        Parameters
+        ----------
+        nb_path : :class:`Path`
+            Path of input notebook, to which we write download notebook.
+        nb : None or :class:`nbformat.NotebookNode`, optional
+            Input notebook.  If None, read from `nb_path`.
+
+        Returns
+        -------
+        dl_content : bytes
+            Contents of written download notebook.
+        """
+        nb = read_nb(nb_path) if nb is None else nb
+        _, dl_nb, jl_nb = self.xref_variants(
+            nb, (self._dl_prefix(), self._jl_prefix()))
+        dl_content = self._write_download(nb_path, dl_nb)
+        for target in self.targets:
+            self._write_jl(nb_path, jl_nb, target)
+        return dl_content
+
+    def _process_incremental(self):
+        """ Process notebooks with changed inputs, and update state file
+
+        Returns
+        -------
+        n_processed : int
+            Number of notebooks processed.
+
+        Raises
+        ------
+        NBProcessError
+            If processing failed for any notebook.  We raise after writing
+            the state for the other notebooks.
+        """
+        state = self._read_state()
+        for cache_path in (self._raw_path, self._dl_cache_path):
+            cache_path.mkdir(parents=True, exist_ok=True)
+        nb_paths = self._nb_paths()
+        outcomes = self._map(
+            partial(_outcome, lambda nb_path: self._update_nb_path(
+                nb_path, state.get(nb_path.name))),
+            nb_paths)
+        results = {p: r for p, (r, e) in zip(nb_paths, outcomes) if e is None}
+        records = {p.name: record for p, (record, _) in results.items()}
+        for cache_path in (*self._raw_path.glob('*'),
+                           *self._dl_cache_path.glob('*')):
+            if cache_path.name not in records:
+                cache_path.unlink()
+        self._state = records
+        self.state_path.write_text(json.dumps(
+            {'version': self._STATE_VERSION,
+             'config': self._config_hash(),
+             'notebooks': records},
+            indent=1, sort_keys=True))
+        if (errors := [(str(p), e) for p, (r, e) in zip(nb_paths, outcomes)
+                       if e is not None]):
+            raise NBProcessError(errors)
+        return sum(processed for _, processed in results.values())
+
+    def _read_state(self):
+        """ Notebook records from state file, or empty dict if no valid state
+        """
+        if self._state is not None:  # From previous run of this instance.
+            return self._state
+        try:
+            state = json.loads(self.state_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+        if (state.get('version') != self._STATE_VERSION or
+            state.get('config') != self._config_hash()):
+            return {}
+        return state['notebooks']
+
+    def _config_hash(self):
+        """ Hash of configuration determining processing output
+        """
+        config = {'processing': [t.config for t in self.targets],
+                  'noteout': self._noteout_config,
+                  'xref_engine': self.xref_engine,
+                  'minify': self.minify,
+                  'strip_meta': self.strip_meta,
+                  'gzip': self.gzip,
+                  'jl_out_paths': [str(t.jl_out_path.resolve())
+                                   for t in self.targets]}
+        return _hash(json.dumps(config, sort_keys=True,
+                                default=str).encode('utf-8'))
+
+    def _update_nb_path(self, nb_path, record):
+        """ Process notebook at `nb_path` if inputs differ from `record`
+
+        Parameters
+        ----------
+        nb_path : :class:`Path`
+            Path of input notebook.
+        record : None or dict
+            Record for this notebook from state file, or None if no record.
+
+        Returns
+        -------
+        record : dict
+            Updated record for notebook.
+        processed : bool
+            True if we processed the notebook.
+        """
+        raw_path = self._raw_path / nb_path.name
+        dl_cache_path = self._dl_cache_path / nb_path.name
+        content = nb_path.read_bytes()
+        in_hash = _hash(content)
+        if record and raw_path.is_file():
+            deps = record['deps']
+            outputs = record['outputs']
+            deps_same = (in_hash in (outputs['download'], deps['input']) and
+                         self._nb_deps(nb_path, deps, deps['input']) == deps)
+            if in_hash == outputs['download']:
+                # Notebook is still our output; input is unchanged.
+                if deps_same and self._nb_outputs(nb_path) == outputs:
+                    return record, False
+                content = raw_path.read_bytes()
+            elif (in_hash == deps['input'] and deps_same and
+                  _file_hash(dl_cache_path) == outputs['download'] and
+                  self._jl_hashes(nb_path) == outputs['jl']):
+                # Quarto rewrote unchanged input; restore download outputs.
+                self._restore_download(nb_path, dl_cache_path.read_bytes(),
+                                       outputs['zip'])
+                return dict(record, outputs=self._nb_outputs(nb_path)), False
+            else:
+                # Changed input notebook, from Quarto build.
+                raw_path.write_bytes(content)
+        else:
+            # New input notebook, from Quarto build.
+            raw_path.write_bytes(content)
+        nb = read_nb(raw_path)
+        deps = self._nb_deps(nb_path, self._nb_dep_names(nb), _hash(content))
+        write_changed(dl_cache_path, self.process_nb_path(nb_path, nb))
+        return {'deps': deps, 'outputs': self._nb_outputs(nb_path)}, True
+
+    def _restore_download(self, nb_path, dl_content, zip_hash):
+        """ Write `dl_content` to `nb_path`, and to zip, if zip not our output
+        """
+        self._write_output(nb_path, dl_content)
+        zf_path = nb_path.with_suffix('.zip')
+        if zf_path.is_file() and _file_hash(zf_path) != zip_hash:
+            rezip(zf_path, {nb_path.name: dl_content})
+
+    def _nb_dep_names(self, nb):
+        """ Data file names and xref keys used by notebook `nb`
+        """
+        data = set()
+        read_res = {t.read_re for t in self.targets}
+        for cell in cell_gen(nb, 'code'):
+            for read_re in read_res:
+                data.update(m['fname'] for m in
+                            read_re.finditer(cell['source']))
+        xrefs = set()
+        for cell in cell_gen(nb, 'markdown'):
+            if self._has_xref(source := cell['source']):
+                xrefs.update(self._HREF_KEY_RE.findall(source))
+        return {'data': dict.fromkeys(sorted(data)),
+                'xrefs': dict.fromkeys(sorted(xrefs))}
+
+    def _nb_deps(self, nb_path, names, in_hash):
+        """ Hashes for input notebook, data files and xrefs in `names`
+        """
+        return {
+            'input': in_hash,
+            'data': {fname: _file_hash(nb_path.parent / fname)
+                     for fname in names['data']},
+            'xrefs': {key: (_hash(str(self.xrefs[key]).encode('utf-8'))
+                            if key in self.xrefs else None)
+                      for key in names['xrefs']}}
+
+    def _nb_outputs(self, nb_path):
+        """ Hashes of output files for notebook at `nb_path`
+        """
+        return {'download': _file_hash(nb_path),
+                'zip': _file_hash(nb_path.with_suffix('.zip')),
+                'jl': self._jl_hashes(nb_path)}
+
+    def _jl_hashes(self, nb_path):
+        return [_file_hash(self._jl_nb_path(nb_path, t))
+                for t in self.targets]
+
+    def update(self):
+        """ Re-scan changed HTML, and reprocess notebooks with changed inputs
+
+        Returns
+        -------
+        n_processed : int
+            Number of notebooks processed.
+        """
+        self.incremental = True
+        self.refresh_xrefs()
+        return self.process()
+
+    def watch(self, interval=0.5, settle=0.2, max_polls=None):
+        """ Process notebooks, and reprocess when input files change
+
+        Parameters
+        ----------
+        interval : float, optional
+            Maximum time in seconds between checks for changed files.
+        settle : float, optional
+            After detecting changes, wait until files have not changed for
+            `settle` seconds before processing.
+        max_polls : None or int, optional
+            If not None, return after this many checks for changed files.
+
+        Errors from processing after the first pass go to stderr, and we retry
+        processing at the next check.
+        """
+        self.update()
+        snapshot = self._watch_snapshot()
+        inotify = self._make_inotify()
+        n_polls = 0
+        while max_polls is None or n_polls < max_polls:
+            n_polls += 1
+            if inotify:
+                inotify.read(timeout=int(interval * 1000))
+            else:
+                time.sleep(interval)
+            if (current := self._watch_snapshot()) == snapshot:
+                continue
+            while True:  # Wait for changes to settle.
+                time.sleep(settle)
+                if (settled := self._watch_snapshot()) == current:
+                    break
+                current = settled
+            try:
+                self.update()
+            except (NBProcessError, OSError) as e:
+                # Maybe a half-written input; keep previous snapshot, so we
+                # retry at the next check.
+                print(f'Processing failed; will retry\n{e}', file=sys.stderr)
+                continue
+            # Snapshot after processing, to ignore our own writes.
+            snapshot = self._watch_snapshot()
+            if inotify:
+                inotify.read(timeout=0)
+
+    def _watch_snapshot(self):
+        """ Modification time and size of watched files
+        """
+        paths = [*self.book_path.glob(self.html_globber),
+                 *self._nb_in_path.rglob('*')]
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # Deleted since glob.
+                continue
+            if not path.is_dir():
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _make_inotify(self):
+        if INotify is None:
+            return None
+        inotify = INotify()
+        mask = (inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO |
+                inotify_flags.CREATE | inotify_flags.DELETE)
+        for path in (self.book_path, self._nb_in_path):
+            inotify.add_watch(path, mask)
+        return inotify
+
+    def _dl_prefix(self):
+        return self._noteout_config['book-url-root'] + '/'
+
+    def _jl_prefix(self):
+        return self._book_base() + '/'
+
+    def _prepare_jl(self):
+        for target in self.targets:
+            self._copy_in_dirs(target)
+            self._write_output(
+                target.jl_out_path / 'jupyter-lite.json',
+                self._JL_JSON_FMT.format(**target.config).encode('utf-8'))
+
+    def _finish_jl(self):
+        for target in self.targets:
+            if not (index := target.config.get('jl-contents-index')):
+                continue
+            write_contents_index(
+                target.jl_out_path,
+                None if index is True else target.jl_out_path / index,
+                exclude=['jupyter-lite.json'])
+
+    def _write_output(self, path, content):
+        """ Write bytes `content` to `path`, and gzipped copy, if changed
+        """
+        changed = write_changed(path, content)
+        gz_path = path.with_name(path.name + '.gz')
+        if self.gzip and (changed or not gz_path.is_file()):
+            gz_path.write_bytes(gz_compress(content, mtime=0))
+
+    def _write_nb(self, nb, path):
+        """ Write notebook `nb` to `path`, returning written bytes
+        """
+        content = nb2bytes(nb, nb_fmt(path), self.minify, self.strip_meta)
+        self._write_output(path, content)
+        return content
+
+    def _hash_downloads(self):
+        """ Write manifest of hashed download URLs, and update HTML links
+        """
+        nb_dir = Path(self._noteout_config['nb-dir']).as_posix()
+        manifest = {}
+        for nb_path in self._nb_paths():
+            for path in (nb_path, nb_path.with_suffix('.zip')):
+                if path.is_file():
+                    manifest[f'{nb_dir}/{path.name}'] = (
+                        f'{nb_dir}/{self._hash_download(path)}')
+        write_changed(self._nb_in_path / 'manifest.json',
+                      json.dumps(manifest, indent=1, sort_keys=True)
+                      .encode('utf-8') + b'\n')
+        self._map(partial(self._relink_page, manifest=manifest),
+                  sorted(self.book_path.glob(self.html_globber)))
+
+    def _hash_download(self, path):
+        """ Hashed URL name for download file `path`
+
+        Writes copy of `path` with hashed name, for "name" mode, and deletes
+        any copies for previous contents.
+        """
+        content = path.read_bytes()
+        digest = (_zip_hash(path) if path.suffix == '.zip' else
+                  _hash(content))[:self._DL_HASH_LEN]
+        if self._dl_hash == 'query':
+            return f'{path.name}?v={digest}'
+        hashed_path = path.with_name(f'{path.stem}.{digest}{path.suffix}')
+        for old_path in path.parent.glob(f'{path.stem}.*{path.suffix}'):
+            if (old_path != hashed_path and
+                self._DL_HASHED_RE.sub('', old_path.name) == path.name):
+                old_path.unlink()
+                old_path.with_name(old_path.name + '.gz').unlink(
+                    missing_ok=True)
+        if not hashed_path.is_file():
+            if path.suffix == '.zip':
+                hashed_path.write_bytes(content)
+            else:
+                self._write_output(hashed_path, content)
+        return hashed_path.name
+
+    def _relink_page(self, page_path, manifest):
+        """ Replace download links in HTML page with hashed URLs in `manifest`
+        """
+        text = page_path.read_bytes().decode('utf-8')
+        if 'notebook-link' not in text:
+            return
+
+        def replace_href(m):
+            # Original URL, from URL maybe hashed by previous run.
+            url = self._DL_HASHED_RE.sub('', m[2].split('?')[0])
+            return m[1] + manifest.get(url, m[2]) + m[3]
+
+        write_changed(page_path,
+                      self._DL_LINK_RE.sub(replace_href, text).encode('utf-8'))
+
+    def _write_download(self, nb_path, dl_nb):
+        content = self._write_nb(dl_nb, nb_path)
+        if (zf_path := nb_path.with_suffix('.zip')).is_file():
+            rezip(zf_path, {nb_path.name: content})
+        return content
+
+    def _jl_nb_path(self, nb_path, target):
+        return target.jl_out_path / (nb_path.stem + self._jl_out_suffix)
+
+    def _write_jl(self, nb_path, prefixed_nb, target):
+        self._write_nb(self.fix_jl(copy_nb(prefixed_nb), target),
+                       self._jl_nb_path(nb_path, target))
+
+    def fix_jl(self, nb, target=None):
+        """ Fix notebook `nb` (from :func:`copy_nb`) for JupyterLite `target`
+
+        None for `target` gives the first target.
+        """
+        return self.fix_data_source(self.fix_kernels(nb, target), target)
 
 
 def get_parser():
@@ -409,8 +1472,33 @@ def get_parser():
     parser.add_argument('quarto_config',
                         help='Path containing "_quarto.yml" or '
                         'Quarto configuration file')
-    parser.add_argument('jl_output_dir',
-                        help='Output directory for JupyterLite notebooks')
+    parser.add_argument('jl_output_dir', nargs='?',
+                        help='Output directory for JupyterLite notebooks.  '
+                        'If "processing" targets have "jl-out-dir", their '
+                        'output directories are relative to this directory')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of threads for reading, processing '
+                        'and writing notebooks; 0 means use all CPUs')
+    parser.add_argument('--minify', action='store_true',
+                        help='Write ipynb notebooks without indentation')
+    parser.add_argument('--strip-meta', action='store_true',
+                        help='Leave out cell metadata for execution and '
+                        'display state from ipynb notebooks')
+    parser.add_argument('--gzip', action='store_true',
+                        help='Also write gzipped notebooks and '
+                        '"jupyter-lite.json", with ".gz" suffix')
+    parser.add_argument('--xref-engine',
+                        choices=NBProcessor.xref_engines,
+                        default='soup',
+                        help='Engine for rewriting notebook cross-references')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only process notebooks with changed inputs')
+    parser.add_argument('--watch', action='store_true',
+                        help='Process incrementally, then watch for, and '
+                        'process, changes, until interrupted')
+    parser.add_argument('--watch-interval', type=float, default=0.5,
+                        help='Seconds between checks for changes with '
+                        '--watch')
     return parser
 
 
@@ -420,8 +1508,20 @@ def main():
     q_config = Path(args.quarto_config)
     if q_config.is_dir():
         q_config = q_config / '_quarto.yml'
-    nbp = NBProcessor(q_config, args.jl_output_dir)
-    nbp.process()
+    nbp = NBProcessor(q_config, args.jl_output_dir,
+                      xref_engine=args.xref_engine,
+                      jobs=args.jobs,
+                      minify=args.minify,
+                      strip_meta=args.strip_meta,
+                      gzip=args.gzip,
+                      incremental=args.incremental)
+    if not args.watch:
+        nbp.process()
+        return
+    try:
+        nbp.watch(interval=args.watch_interval)
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == '__main__':
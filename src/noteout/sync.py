@@ -0,0 +1,183 @@
+""" Synchronize directory trees, copying only changed files
+
+We use this to copy data directories into the JupyterLite output, where most
+files do not change between builds.
+"""
+
+import filecmp
+import os
+from pathlib import Path
+import shutil
+
+
+# Methods for deciding whether a destination file is up to date.
+SYNC_COMPARES = ('stat', 'content')
+
+
+def sync_tree(src, dst, compare='stat', link=False, delete=False):
+    """ Make directory `dst` contain all files in `src`, copying changed files
+
+    Parameters
+    ----------
+    src : str or :class:`Path`
+        Source directory.
+    dst : str or :class:`Path`
+        Destination directory.  Created if it does not exist.
+    compare : {'stat', 'content'}, optional
+        Method for deciding that a destination file matches its source file.
+        'stat' checks that size and modification time match; files copied by
+        this function keep the modification time of their source.  'content'
+        checks that size and file contents match.
+    link : {False, True}, optional
+        If True, make changed destination files as hard links to source files,
+        falling back to copying where hard links are not possible, as for
+        files on different devices.  Writing into a linked source file, rather
+        than replacing it, also changes the destination file.
+    delete : {False, True}, optional
+        If True, delete files and directories in `dst` that are not in `src`.
+
+    Returns
+    -------
+    copied : list
+        Paths, relative to `dst`, of files we copied or linked.
+    deleted : list
+        Paths, relative to `dst`, of files and directories we deleted.
+    """
+    if compare not in SYNC_COMPARES:
+        raise ValueError(f'compare should be one of {SYNC_COMPARES}')
+    src, dst = Path(src), Path(dst)
+    copied, src_rels = [], set()
+    for dirpath, dirnames, filenames in os.walk(src, followlinks=True):
+        rel_dir = Path(dirpath).relative_to(src)
+        out_dir = dst / rel_dir
+        out_dir.mkdir(parents=True, exist_ok=True)
+        src_rels.update(rel_dir / name for name in dirnames)
+        for name in filenames:
+            src_rels.add(rel_path := rel_dir / name)
+            if sync_file(Path(dirpath) / name, out_dir / name, compare,
+                         link):
+                copied.append(rel_path)
+    return copied, (_delete_extra(dst, src_rels) if delete else [])
+
+
+def sync_file(src, dst, compare='stat', link=False):
+    """ Copy or link file `src` to `dst` if `dst` is not up to date
+
+    Parameters
+    ----------
+    src : str or :class:`Path`
+        Source file.
+    dst : str or :class:`Path`
+        Destination file.  Directory containing `dst` must exist.
+    compare : {'stat', 'content'}, optional
+        Method for deciding that `dst` matches `src`; see :func:`sync_tree`.
+    link : {False, True}, optional
+        If True, make `dst` as hard link to `src`, where possible.
+
+    Returns
+    -------
+    copied : bool
+        True if we copied or linked `src` to `dst`.
+    """
+    src, dst = Path(src), Path(dst)
+    if _up_to_date(src, dst, compare):
+        return False
+    _put_file(src, dst, link)
+    return True
+
+
+def write_changed(path, content):
+    """ Write bytes `content` to `path` if file contents differ
+
+    Returns
+    -------
+    changed : bool
+        True if we wrote the file.
+    """
+    path = Path(path)
+    try:
+        if path.read_bytes() == content:
+            return False
+    except FileNotFoundError:
+        path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return True
+
+
+def prune_dirs(dst, keep):
+    """ Delete subdirectories directly in `dst` with names not in `keep`
+
+    Parameters
+    ----------
+    dst : str or :class:`Path`
+        Directory to prune.  We leave files in `dst` itself alone.
+    keep : container
+        Names of subdirectories to keep.
+
+    Returns
+    -------
+    deleted : list
+        Names of subdirectories we deleted.
+    """
+    deleted = []
+    for path in sorted(Path(dst).iterdir()):
+        if path.name in keep or not path.is_dir():
+            continue
+        if path.is_symlink():
+            path.unlink()
+        else:
+            shutil.rmtree(path)
+        deleted.append(path.name)
+    return deleted
+
+
+def _up_to_date(src_path, dst_path, compare):
+    try:
+        dst_stat = dst_path.stat()
+    except FileNotFoundError:
+        return False
+    src_stat = src_path.stat()
+    if (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev,
+                                              dst_stat.st_ino):
+        return True  # Hard link to source.
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if compare == 'stat':
+        return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+    return filecmp.cmp(src_path, dst_path, shallow=False)
+
+
+def _put_file(src_path, dst_path, link):
+    # Remove existing file first, so we do not write through a hard link into
+    # a source file.
+    if dst_path.is_symlink() or dst_path.exists():
+        dst_path.unlink()
+    if link:
+        try:
+            os.link(src_path, dst_path)
+            return
+        except OSError:
+            pass
+    shutil.copy2(src_path, dst_path)
+
+
+def _delete_extra(dst, src_rels):
+    """ Delete files and directories in `dst` with relative path not in
+    `src_rels`
+    """
+    deleted = []
+    for dirpath, dirnames, filenames in os.walk(dst, topdown=False):
+        rel_dir = Path(dirpath).relative_to(dst)
+        for name in filenames:
+            if (rel_path := rel_dir / name) not in src_rels:
+                (Path(dirpath) / name).unlink()
+                deleted.append(rel_path)
+        for name in dirnames:
+            if (rel_path := rel_dir / name) not in src_rels:
+                path = Path(dirpath) / name
+                if path.is_symlink():
+                    path.unlink()
+                else:
+                    shutil.rmtree(path)
+                deleted.append(rel_path)
+    return deleted
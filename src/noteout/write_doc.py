@@ -1,23 +1,41 @@
 #!/usr/bin/env python3
 """ Filter to write JSON for input document
 
-Useful for debugging Quarto's intermediate files.
+Useful for debugging Quarto's intermediate files.  See ``capture.py`` for
+configuration.
+
+When reading from stdin, we write the input document to stdout unchanged.
 """
 import json
-from io import StringIO
 
 import panflute as pf
 
-
-from noteout.write_meta import new_fobj
+from noteout.capture import capture, capture_params, json_writer
+from noteout.nutils import load_raw_keys, raw_meta_doc, pass_through
 
 
 def dump_doc(doc):
-    with new_fobj('doc_{:03d}.json') as fobj:
-        out = StringIO()
-        pf.dump(doc, out)
-        out_dict = json.loads(out.getvalue())
-        json.dump(out_dict, fobj, indent=2)
+    params = capture_params(doc)
+    capture('doc_{:03d}.json', params,
+            json_writer(doc, params['capture-indent'],
+                        default=lambda elem: elem.to_json()),
+            'write_doc')
+
+
+def dump_json_doc(json_src):
+    doc = raw_meta_doc(
+        load_raw_keys(json_src, ('pandoc-api-version', 'meta')))
+    params = capture_params(doc)
+    indent = params['capture-indent']
+
+    def write(fobj):
+        if indent is None:
+            fobj.write(json_src)
+        else:
+            # Decode full document only if capturing.
+            json_writer(json.loads(json_src), indent)(fobj)
+
+    capture('doc_{:03d}.json', params, write, 'write_doc')
 
 
 def action(elem, doc):
@@ -25,6 +43,8 @@ def action(elem, doc):
 
 
 def main(doc=None):
+    if doc is None:
+        return pass_through(dump_json_doc)
     return pf.run_filter(action,
                          prepare=dump_doc,
                          doc=doc)
@@ -1,29 +1,43 @@
+#!/usr/bin/env python3
+""" Filter to write JSON for input document metadata, and environment
+
+Useful for debugging Quarto's intermediate files.  See ``capture.py`` for
+configuration.
+
+When reading from stdin, we decode only the document metadata, and write the
+input document to stdout unchanged.
+"""
 import os
-import os.path as op
-import json
 from contextlib import contextmanager
+from io import TextIOWrapper
 
 import panflute as pf
 
+from noteout.capture import capture, capture_params, json_writer, open_capture
+from noteout.nutils import load_raw_keys, raw_meta_doc, pass_through
+
 
 @contextmanager
 def new_fobj(template, max_n=1000):
-    for i in range(max_n):
-        fname = template.format(i)
-        if not op.exists(fname):
-            break
-    else:
-        raise RuntimeError(
-            f'Ran out of files with max n {max_n} and template "{template}"')
-    with open(fname, 'wt') as fobj:
-        yield fobj
+    """ Open new numbered text file from `template` for writing
+    """
+    with open_capture(template, max_n=max_n) as (fobj, path):
+        with TextIOWrapper(fobj, 'utf-8') as text_fobj:
+            yield text_fobj
 
 
 def dump_meta(doc):
+    params = capture_params(doc)
     d = doc.get_metadata()
     d['env'] = dict(os.environ)
-    with new_fobj('meta_{:03d}.json') as fobj:
-        json.dump(d, fobj, indent=2)
+    capture('meta_{:03d}.json', params,
+            json_writer(d, params['capture-indent']),
+            'write_meta')
+
+
+def dump_json_meta(json_src):
+    raw_doc = load_raw_keys(json_src, ('pandoc-api-version', 'meta'))
+    dump_meta(raw_meta_doc(raw_doc))
 
 
 def action(elem, doc):
@@ -31,6 +45,8 @@ def action(elem, doc):
 
 
 def main(doc=None):
+    if doc is None:
+        return pass_through(dump_json_meta)
     return pf.run_filter(action,
                          prepare=dump_meta,
                          doc=doc)
@@ -0,0 +1,129 @@
+""" Test capture of documents and metadata
+"""
+
+import gzip
+import json
+from pathlib import Path
+
+import panflute as pf
+
+import noteout.capture as nc
+import noteout.write_doc as write_doc
+import noteout.write_meta as write_meta
+
+from .tutils import run_stdio
+
+import pytest
+
+
+CAPTURE_MD = """\
+---
+noteout:
+  capture-dir: captures
+quarto-doc-params:
+  input_file: chapter.qmd
+---
+
+Some text with *emphasis*.
+"""
+
+
+def test_open_capture(in_tmp_path):
+    template = 'out_{:03d}.txt'
+    for i in range(2):
+        with nc.open_capture(template) as (fobj, path):
+            fobj.write(b'text %d' % i)
+        assert path == Path(f'out_00{i}.txt')
+    assert Path('out_001.txt').read_bytes() == b'text 1'
+    # Skip existing files, never overwrite.
+    Path('out_003.txt').write_text('existing')
+    for i in (2, 4):
+        with nc.open_capture(template) as (fobj, path):
+            fobj.write(b'more')
+        assert path.name == f'out_00{i}.txt'
+    assert Path('out_003.txt').read_text() == 'existing'
+    # Counter restarts from existing files if counter file removed.
+    Path(nc.COUNTER_FNAME).unlink()
+    with nc.open_capture(template) as (fobj, path):
+        pass
+    assert path.name == 'out_005.txt'
+    with pytest.raises(RuntimeError):
+        with nc.open_capture(template, max_n=6):
+            pass
+    # Compression.
+    out_dir = in_tmp_path / 'sub'
+    out_dir.mkdir()
+    with nc.open_capture(template, out_dir, compress=True) as (fobj, path):
+        fobj.write(b'compressed')
+    assert path == out_dir / 'out_000.txt.gz'
+    assert gzip.decompress(path.read_bytes()) == b'compressed'
+
+
+def test_write_meta_compat(in_tmp_path):
+    for i in range(2):
+        with write_meta.new_fobj('meta_{:03d}.json') as fobj:
+            fobj.write(f'{{"n": {i}}}')
+    assert json.loads(Path('meta_001.json').read_text()) == {'n': 1}
+    with pytest.raises(RuntimeError):
+        with write_meta.new_fobj('meta_{:03d}.json', max_n=2):
+            pass
+
+
+def test_capture(in_tmp_path):
+    doc = pf.convert_text(CAPTURE_MD, standalone=True)
+    params = nc.capture_params(doc)
+    assert params['capture-dir'] == 'captures'
+    assert params['capture-indent'] == 2
+    assert params['input_file'] == 'chapter.qmd'
+    out_dir = Path('captures')
+    write = nc.json_writer({'a': [1, 2]})
+    path = nc.capture('c_{:03d}.json', params, write, 'my_filter')
+    assert path == out_dir / 'c_000.json'
+    assert path.read_text() == json.dumps({'a': [1, 2]}, indent=2)
+    index = [json.loads(line) for line in
+             (out_dir / nc.INDEX_FNAME).read_text().splitlines()]
+    assert index == [{'file': 'c_000.json',
+                      'filter': 'my_filter',
+                      'input_file': 'chapter.qmd',
+                      'format': 'html'}]
+    # Sampling.
+    params['capture-every'] = 3
+    paths = [nc.capture('c_{:03d}.json', params, write, 'my_filter')
+             for i in range(5)]
+    assert [p and p.name for p in paths] == [
+        None, None, 'c_001.json', None, None]
+    params['capture-every'] = 1
+    params['capture-match'] = r'^other'
+    assert nc.capture('c_{:03d}.json', params, write, 'my_filter') is None
+    params['capture-match'] = r'^chap'
+    assert nc.capture('c_{:03d}.json', params, write, 'my_filter').name == (
+        'c_002.json')
+    assert len((out_dir / nc.INDEX_FNAME).read_text().splitlines()) == 3
+
+
+def test_write_filters(in_tmp_path):
+    doc = pf.convert_text(CAPTURE_MD, standalone=True)
+    out_dir = Path('captures')
+    in_bytes = json.dumps(doc.to_json()).encode('utf-8')
+    # Pass-through, and Panflute, filters give same output.
+    assert run_stdio(write_doc.main, in_bytes) == in_bytes
+    write_doc.main(doc)
+    doc_0, doc_1 = ((out_dir / f'doc_00{i}.json').read_text()
+                    for i in range(2))
+    assert doc_0 == doc_1
+    assert json.loads(doc_0) == json.loads(in_bytes)
+    assert run_stdio(write_meta.main, in_bytes) == in_bytes
+    meta = json.loads((out_dir / 'meta_000.json').read_text())
+    assert meta['quarto-doc-params'] == {'input_file': 'chapter.qmd'}
+    assert 'env' in meta
+    # Compact, compressed captures.  Pass-through writes input unchanged.
+    doc.metadata['noteout']['capture-indent'] = 0
+    doc.metadata['noteout']['capture-gzip'] = True
+    in_bytes = json.dumps(doc.to_json(), indent=1).encode('utf-8')
+    assert run_stdio(write_doc.main, in_bytes) == in_bytes
+    assert gzip.decompress(
+        (out_dir / 'doc_002.json.gz').read_bytes()) == in_bytes
+    write_doc.main(doc)
+    out_bytes = gzip.decompress((out_dir / 'doc_003.json.gz').read_bytes())
+    assert json.loads(out_bytes) == json.loads(in_bytes)
+    assert b'\n' not in out_bytes
@@ -0,0 +1,71 @@
+""" Test running several filters in one process
+"""
+
+from importlib import import_module
+import json
+from pathlib import Path
+
+from noteout.chain import CHAIN_FILTERS, get_chain
+import noteout.chain as nch
+import noteout.post_chain as npch
+from noteout.nutils import FilterError
+
+from .tutils import q2doc, run_stdio
+from . import test_mark_notebooks as tmnb
+
+import pytest
+
+
+IN_RMD = tmnb.INP_RMD.format(nb_text=tmnb.SIMPLE_NB) + '''
+
+Text [for pre]{.pre-drop} and [for all]{.all-drop}.
+
+::: nb-only
+Only in notebook.
+:::
+'''
+
+
+def _separate(names, in_bytes):
+    for name in names:
+        mod = import_module('noteout.' + CHAIN_FILTERS[name])
+        in_bytes = run_stdio(mod.main, in_bytes)
+    return in_bytes
+
+
+def test_chain(in_tmp_path):
+    in_doc = q2doc(IN_RMD)
+    in_doc.metadata['noteout'] = {
+        'nb-format': 'Rmd',
+        'book-url-root': 'https://resampling-stats.github.io/latest-r',
+        'interact-url': '/interact/lab/index.html?path=',
+        'pre-filter': ['pre-drop'],
+        'filter-divspans': ['all-drop'],
+        'chain': ['pre', 'divspans', 'mark'],
+        'post-chain': ['export', 'nb-only']}
+    in_bytes = json.dumps(in_doc.to_json()).encode('utf-8')
+    pre_bytes = run_stdio(nch.main, in_bytes)
+    assert pre_bytes != in_bytes
+    assert pre_bytes == _separate(['pre', 'divspans', 'mark'], in_bytes)
+    nb_path = Path('notebooks') / 'a_notebook.Rmd'
+    assert not nb_path.exists()
+    post_bytes = run_stdio(npch.main, pre_bytes)
+    assert nb_path.is_file()
+    nb_text = nb_path.read_text()
+    nb_path.unlink()
+    assert post_bytes == _separate(['export', 'nb-only'], pre_bytes)
+    assert nb_path.read_text() == nb_text
+    # Running on doc filters in place.
+    assert nch.main(in_doc) is in_doc
+    assert json.loads(json.dumps(in_doc.to_json())) == json.loads(pre_bytes)
+
+
+def test_get_chain():
+    doc = q2doc('Some text.')
+    assert get_chain(doc) == []
+    doc.metadata['noteout'] = {'chain': 'pre', 'post-chain': ['export']}
+    assert get_chain(doc) == ['pre']
+    assert get_chain(doc, 'noteout.post-chain') == ['export']
+    doc.metadata['noteout']['chain'] = ['pre', 'foo']
+    with pytest.raises(FilterError, match='foo'):
+        get_chain(doc)
@@ -0,0 +1,138 @@
+""" Test filter daemon and client
+"""
+
+from importlib import import_module
+import json
+import os
+from pathlib import Path
+from threading import Thread
+
+import panflute as pf
+
+import noteout.daemon as nd
+
+from .tutils import run_stdio
+from .test_nutils import RAW_MD
+
+import pytest
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / 'test.sock')
+    server = nd.make_server(socket_path)
+    thread = Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_run_filter(in_tmp_path):
+    in_bytes = json.dumps(
+        pf.convert_text(RAW_MD, standalone=True).to_json()).encode('utf-8')
+    mod = import_module('noteout.filter_divspans')
+    exp_out = run_stdio(mod.main, in_bytes)
+    assert nd.run_filter('filter_divspans', in_bytes) == (0, exp_out, '')
+    # Filter runs in given directory, with given environment.
+    sub_path = in_tmp_path / 'sub'
+    sub_path.mkdir()
+    status, out, err = nd.run_filter('write_meta', in_bytes, ['latex'],
+                                     str(sub_path), {'MY_VAR': 'foo'})
+    assert (status, out, err) == (0, in_bytes, '')
+    meta = json.loads((sub_path / 'meta_000.json').read_text())
+    assert meta['env'] == {'MY_VAR': 'foo'}
+    assert 'MY_VAR' not in os.environ
+    assert Path.cwd() == in_tmp_path
+    # Errors.
+    status, out, err = nd.run_filter('filter_divspans', b'not json')
+    assert status == 1
+    assert 'JSONDecodeError' in err
+    status, out, err = nd.run_filter('os', in_bytes)
+    assert status == 1
+    assert 'Unknown filter' in err
+
+
+def test_daemon(server, in_tmp_path):
+    socket_path = server.server_address
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+    with pytest.raises(RuntimeError):
+        nd.make_server(socket_path)
+    in_bytes = json.dumps(
+        pf.convert_text(RAW_MD, standalone=True).to_json()).encode('utf-8')
+    exp = nd.run_filter('filter_divspans', in_bytes, ['html'])
+    with nd._connect(socket_path) as sock:
+        assert nd.request(sock, 'filter_divspans', in_bytes,
+                          ['html']) == exp
+    with nd._connect(socket_path) as sock:
+        status, out, err = nd.request(sock, 'filter_divspans', b'[1, 2]')
+    assert status == 1
+    assert out == b''
+    # Client sends stdin to daemon.
+    assert (run_stdio(lambda: nd.run_client('filter_divspans', socket_path),
+                      in_bytes) == exp[1])
+    # Client falls back to running filter in process.
+    in_bytes = in_bytes.replace(b'"todo"', b'"other"')
+    exp_out = nd.run_filter('filter_divspans', in_bytes)[1]
+    assert exp_out != exp[1]
+    assert (run_stdio(lambda: nd.run_client('filter_divspans',
+                                            socket_path + '.missing'),
+                      in_bytes) == exp_out)
+
+
+def test_stale_socket(tmp_path):
+    socket_path = str(tmp_path / 'test.sock')
+    server = nd.make_server(socket_path)
+    server.server_close()
+    # Socket file without server.
+    assert os.path.exists(socket_path)
+    server = nd.make_server(socket_path)
+    server.server_close()
+
+
+def test_socket_path(tmp_path, monkeypatch):
+    for name in ('NOTEOUT_DAEMON_SOCKET', 'XDG_RUNTIME_DIR'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('TMPDIR', str(tmp_path))
+    private_dir = tmp_path / f'noteout-{os.getuid()}'
+    assert nd.default_socket_path() == str(private_dir / 'noteout.sock')
+    # Server makes private directory for socket.
+    server = nd.make_server()
+    server.server_close()
+    assert private_dir.stat().st_mode & 0o777 == 0o700
+    assert server.server_address == nd.default_socket_path()
+    # Refuse to use directory other users can use.
+    private_dir.chmod(0o755)
+    with pytest.raises(RuntimeError):
+        nd.make_server()
+    monkeypatch.setenv('XDG_RUNTIME_DIR', str(tmp_path / 'run'))
+    assert nd.default_socket_path() == str(tmp_path / 'run' / 'noteout.sock')
+    monkeypatch.setenv('NOTEOUT_DAEMON_SOCKET', 'my.sock')
+    assert nd.default_socket_path() == 'my.sock'
+
+
+def test_socket_owner(server, monkeypatch):
+    socket_path = server.server_address
+    in_bytes = json.dumps(
+        pf.convert_text(RAW_MD, standalone=True).to_json()).encode('utf-8')
+    # Socket appears to belong to another user.
+    uid = os.getuid()
+    monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+    with pytest.raises(PermissionError):
+        nd._connect(socket_path)
+    with pytest.raises(RuntimeError):
+        nd.make_server(socket_path)
+    assert os.path.exists(socket_path)
+    # Client runs filter in process, without sending request.
+    exp_out = nd.run_filter('filter_divspans', in_bytes)[1]
+    monkeypatch.setattr(nd, 'request', None)
+    assert (run_stdio(lambda: nd.run_client('filter_divspans', socket_path),
+                      in_bytes) == exp_out)
+    monkeypatch.setattr(os, 'getuid', lambda: uid)
+    # Refuse to remove file that is not a socket.
+    other_path = os.path.join(os.path.dirname(socket_path), 'other.sock')
+    Path(other_path).write_text('Not a socket')
+    with pytest.raises(RuntimeError):
+        nd.make_server(other_path)
+    assert Path(other_path).read_text() == 'Not a socket'
@@ -9,6 +9,7 @@ Here we are doing the second pass of the two-pass method.
     * Make a zip file for notebook with read data files.
 """
 
+import json
 from pathlib import Path
 import shutil
 from zipfile import ZipFile
@@ -18,7 +19,7 @@ from panflute import Doc, Header, Para, Str, Space, Div, Plain
 from noteout.nutils import filter_doc, fmt2fmt
 import noteout.export_notebooks as enb
 
-from .tutils import q2md, q2doc, fmt2md, filter_doc_nometa
+from .tutils import q2md, q2doc, fmt2md, filter_doc_nometa, run_stdio
 from . import test_mark_notebooks as tmnb
 
 
@@ -51,6 +52,19 @@ def test_basic(in_tmp_path):
         + tmnb.SIMPLE_NB)
 
 
+def test_pass_through(in_tmp_path):
+    in_doc = q2doc(_with_nb(tmnb.SIMPLE_NB))
+    in_doc.metadata['noteout'] = {'nb-format': 'Rmd'}
+    in_bytes = json.dumps(in_doc.to_json(), indent=1).encode('utf-8')
+    # Filtering stdin writes notebook, and passes input unchanged to stdout.
+    assert run_stdio(enb.main, in_bytes) == in_bytes
+    out_nb_path = Path('notebooks') / 'a_notebook.Rmd'
+    stdin_nb = out_nb_path.read_text()
+    out_nb_path.unlink()
+    filter_doc(in_doc, enb)
+    assert out_nb_path.read_text() == stdin_nb
+
+
 def test_nb_outputs(in_tmp_path):
     metadata = {'noteout': {'nb-format': 'Rmd'}}
     data_path = Path('data')
@@ -0,0 +1,27 @@
+""" Test filter modules do not import slow modules before use
+"""
+
+import subprocess
+import sys
+
+import pytest
+
+
+@pytest.mark.parametrize('mod_name, not_imported', (
+    ('filter_divspans', ('jupytext', 'nbformat', 'bs4')),
+    ('filter_pre', ('jupytext', 'nbformat', 'bs4')),
+    ('filter_nb_only', ('jupytext', 'nbformat', 'bs4')),
+    ('filter_code', ('jupytext', 'nbformat', 'bs4')),
+    ('mark_notebooks', ('jupytext', 'nbformat', 'bs4')),
+    ('export_notebooks', ('jupytext', 'nbformat', 'bs4')),
+    ('write_meta', ('jupytext', 'nbformat', 'bs4')),
+    ('write_doc', ('jupytext', 'nbformat', 'bs4')),
+    ('chain', ('jupytext', 'nbformat', 'bs4')),
+    ('process_notebooks', ('panflute', 'bs4')),
+))
+def test_lazy_imports(mod_name, not_imported):
+    code = (f'import sys, noteout.{mod_name}; '
+            f'print([m for m in {not_imported} if m in sys.modules])')
+    proc = subprocess.run([sys.executable, '-c', code],
+                          capture_output=True, text=True, check=True)
+    assert proc.stdout.strip() == '[]'
@@ -0,0 +1,43 @@
+""" Test jlcontents module
+"""
+
+import json
+
+from noteout.jlcontents import write_contents_index
+
+
+def test_write_contents_index(tmp_path):
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'df.csv').write_text('a,b\n1,2\n')
+    (tmp_path / 'nb.ipynb').write_text('{}')
+    (tmp_path / 'nb.ipynb.gz').write_bytes(b'')
+    (tmp_path / 'jupyter-lite.json').write_text('{}')
+    (tmp_path / '.hidden').write_text('')
+    written = write_contents_index(tmp_path, exclude=['jupyter-lite.json'])
+    index_path = tmp_path / 'api' / 'contents'
+    assert sorted(written) == [index_path / 'all.json',
+                               index_path / 'data' / 'all.json']
+    root = json.loads((index_path / 'all.json').read_text())
+    assert (root['type'], root['path'], root['format']) == (
+        'directory', '', 'json')
+    assert [(m['name'], m['path'], m['type'], m['mimetype'], m['size'])
+            for m in root['content']] == [
+                ('data', 'data', 'directory', None, None),
+                ('nb.ipynb', 'nb.ipynb', 'notebook',
+                 'application/x-ipynb+json', 2)]
+    assert all(m['content'] is None for m in root['content'])
+    assert root['content'][1]['last_modified'].endswith('Z')
+    data = json.loads((index_path / 'data' / 'all.json').read_text())
+    assert data['path'] == 'data'
+    assert [(m['path'], m['type'], m['mimetype'], m['size'])
+            for m in data['content']] == [
+                ('data/df.csv', 'file', 'text/csv', 8)]
+    # Unchanged contents, no writes.
+    assert write_contents_index(tmp_path,
+                                exclude=['jupyter-lite.json']) == []
+    # Index in other directory.
+    out_path = tmp_path.parent / 'index'
+    write_contents_index(tmp_path, out_path)
+    names = [m['name'] for m in
+             json.loads((out_path / 'all.json').read_text())['content']]
+    assert names == ['api', 'data', 'jupyter-lite.json', 'nb.ipynb']
@@ -0,0 +1,113 @@
+""" Test notebook reading and writing
+"""
+
+from copy import deepcopy
+
+import jupytext
+from nbformat.v4 import (new_notebook, new_markdown_cell, new_code_cell,
+                         new_output)
+
+import noteout.nbio as nbio
+from noteout.nbio import read_nb, write_nb, nb2bytes, reads_ipynb
+
+import pytest
+
+
+@pytest.fixture(params=('json', 'orjson'))
+def codec(request, monkeypatch):
+    if request.param == 'json':
+        monkeypatch.setattr(nbio, 'orjson', None)
+    elif nbio.orjson is None:
+        pytest.skip('orjson not installed')
+    return request.param
+
+
+def make_nb():
+    code = new_code_cell(
+        'import numpy as np\nprint("hello")\nnp.arange(3)',
+        execution_count=1,
+        outputs=[
+            new_output('stream', name='stdout', text='hello\nagain\n'),
+            new_output('execute_result',
+                       data={'text/plain': 'array([0, 1, 2])\nline 2',
+                             'text/html': '<b>array</b>\n<i>x</i>',
+                             'application/json': {'a': [1, 2]}},
+                       execution_count=1),
+            new_output('display_data',
+                       data={'image/png': 'iVBORw0KGgo=\n',
+                             'image/svg+xml': '<svg>\n</svg>'}),
+            new_output('error', ename='ValueError', evalue='bad',
+                       traceback=['line 1', 'line 2'])])
+    md = new_markdown_cell('# Title\n\nSome text — with ünïcödé.\n',
+                           attachments={'a.png': {'image/png': 'abc\ndef'}})
+    md['metadata']['trusted'] = True
+    return new_notebook(
+        cells=[md, code, new_markdown_cell('')],
+        metadata={'kernelspec': {'name': 'python3',
+                                 'display_name': 'Python 3'},
+                  'jupytext': {'text_representation': {'format_name': 'rmd'},
+                               'main_language': 'python'},
+                  'signature': 'sha256:abc'})
+
+
+@pytest.mark.parametrize('fmt', ('ipynb', 'Rmd', 'md'))
+def test_write_nb(tmp_path, fmt, codec):
+    nb = make_nb()
+    orig_nb = deepcopy(nb)
+    jt_path = tmp_path / f'jt.{fmt}'
+    nbio_path = tmp_path / f'nbio.{fmt}'
+    jupytext.write(nb, jt_path)
+    content = write_nb(nb, nbio_path)
+    # Same output as Jupytext.
+    assert nbio_path.read_bytes() == jt_path.read_bytes() == content
+    assert nb2bytes(nb, fmt) == content
+    # Explicit format.
+    write_nb(nb, tmp_path / 'other.txt', fmt=fmt)
+    assert (tmp_path / 'other.txt').read_bytes() == content
+    # Input notebook not modified.
+    assert nb == orig_nb
+    # Same notebook read back (cell ids are random for text formats).
+    assert (nb2bytes(read_nb(nbio_path), fmt) ==
+            nb2bytes(jupytext.read(jt_path), fmt))
+    if fmt == 'ipynb':
+        assert read_nb(nbio_path) == jupytext.read(jt_path)
+
+
+def test_minify(tmp_path, codec):
+    nb = make_nb()
+    ipynb_path = tmp_path / 'nb.ipynb'
+    write_nb(nb, ipynb_path)
+    min_path = tmp_path / 'nb_min.ipynb'
+    content = write_nb(nb, min_path, minify=True)
+    assert len(content) < len(ipynb_path.read_bytes())
+    assert content.count(b'\n') == 1
+    assert read_nb(min_path) == read_nb(ipynb_path)
+    assert jupytext.read(min_path) == jupytext.read(ipynb_path)
+    # Minify has no effect for text formats.
+    assert nb2bytes(nb, 'Rmd', minify=True) == nb2bytes(nb, 'Rmd')
+
+
+def test_strip_meta(codec):
+    nb = make_nb()
+    nb.cells[1].metadata.update(
+        {'execution': {'iopub.execute_input': '2024-01-01T00:00:00Z'},
+         'collapsed': False,
+         'tags': ['keep']})
+    orig_nb = deepcopy(nb)
+    stripped = reads_ipynb(nb2bytes(nb, 'ipynb', strip_meta=True))
+    assert stripped.cells[1].metadata == {'tags': ['keep']}
+    assert nb == orig_nb
+    # Otherwise the same notebook.
+    for cell in nb.cells:
+        cell.metadata.pop('execution', None)
+        cell.metadata.pop('collapsed', None)
+    assert stripped == reads_ipynb(nb2bytes(nb, 'ipynb'))
+
+
+def test_reads_ipynb(codec):
+    nb = make_nb()
+    content = jupytext.writes(nb, 'ipynb')
+    assert reads_ipynb(content) == jupytext.reads(content, 'ipynb')
+    assert reads_ipynb(content.encode('utf-8')) == reads_ipynb(content)
+    # Transient metadata dropped.
+    assert 'signature' not in reads_ipynb(content)['metadata']
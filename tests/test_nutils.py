@@ -1,12 +1,25 @@
 """ Test nutils module
 """
 
+from copy import deepcopy
+from functools import partial
+from importlib import import_module
+from io import BytesIO, StringIO
+import json
 from pathlib import Path
+import random
 
 import jupytext as jpt
 import panflute as pf
 
-from noteout.nutils import find_data_files, quartoize, fill_params, FilterError
+from noteout.nutils import (find_data_files, quartoize, fill_params, fmt2fmt,
+                            FilterError, Filter, filter_doc, load_raw_keys,
+                            raw_meta_doc, pass_through, pruned_walk,
+                            clone_doc, _BACKTICK_BLOCK_RE, _BACKTICK_SUB_PAT)
+from noteout.filter_divspans import DivSpanFilter
+import noteout.write_meta as write_meta
+
+from .tutils import run_stdio
 
 import pytest
 
@@ -96,6 +109,40 @@ T2'''
         quartoize('Text\n```{r eval=True}\na <- 1\n```') ==
         'Text\n\n::: cell\n```{.r .cell-code eval=True}\na <- 1\n```'
         '\n\n:::\n')
+    # Unclosed blocks.
+    unclosed = 'Text\n\n```{r}\na <- 1\n\n```{python}\nb = 1\n' * 1000
+    assert quartoize(unclosed) == unclosed
+    assert (quartoize(in_str + '\n\n' + unclosed) ==
+            exp_str + '\n\n' + unclosed)
+    # Unclosed braces in block starts; the regular expression takes
+    # quadratic time for these.
+    unclosed = '```{r x\n' * 50_000
+    assert quartoize(unclosed) == unclosed
+    closed = '```{r x\n' * 20 + '}\n\n\n' + 'a <- 1\n```\n'
+    assert quartoize(closed) == _BACKTICK_BLOCK_RE.sub(_BACKTICK_SUB_PAT,
+                                                       closed)
+    # Reading from file-like in fmt2fmt.
+    assert (fmt2fmt(StringIO(in_str), in_fmt='quarto-like') ==
+            fmt2fmt(in_str, in_fmt='quarto-like') ==
+            fmt2fmt(exp_str))
+
+
+# Lines for random documents for testing quartoize.
+_Q_LINES = ('```{r}', '```{python}', '```', '  ```', '```  ', '', '  ', '\t',
+            'text', 'a <- 1', '}', '```{r x', '```{r eval=T}', '```{r x} y',
+            '{r}', '```python', '````', ' ```{r}', '```{ r}', '``` {r}',
+            '```{r\t}', 'x }', '\xa0', '\u2028 ```{r}', '```{r,x}', '\r')
+
+
+def test_quartoize_random():
+    # Output is same as for regular expression substitution.
+    rng = random.Random(1966)
+    for i in range(5000):
+        lines = [rng.choice(_Q_LINES) for _ in range(rng.randint(0, 12))]
+        in_md = (rng.choice(['\n', '\n\n']).join(lines) +
+                 rng.choice(['', '\n', '\n\n']))
+        assert quartoize(in_md) == _BACKTICK_BLOCK_RE.sub(_BACKTICK_SUB_PAT,
+                                                          in_md)
 
 
 def test_fill_params():
@@ -119,3 +166,173 @@ def test_fill_params():
     exp = default.copy()
     exp['interact-url'] = 'https://example.com'
     assert fill_params(meta, ('noteout.interact-url',)) == exp
+
+
+RAW_MD = '''\
+---
+noteout:
+  filter-divspans: [todo, nb-only]
+  pre-filter: [todo]
+  filter-langs: [python]
+blurb: "Meta with [dropped]{.todo} span"
+---
+
+Some text [a span]{.todo} and [kept]{.other}.
+
+::: {.todo}
+A div.
+
+::: nb-only
+Nested div.
+:::
+
+:::
+
+::: {.other}
+[A nested]{.nb-only} span.
+:::
+
+```python
+a = 1
+```
+
+```r
+a <- 1
+```
+
+```{python}
+b = 2
+```
+
+Inline `{python} 1 + 1` and `{python all_eds=TRUE} 2 + 2` and `{r} 3`.
+
+A footnote.[^note]
+
+| Col 1 | Col 2 |
+|-------|-------|
+| [Cell]{.todo} | `{r} 4` |
+
+[^note]: Note with [span]{.nb-only}.
+
+    ::: todo
+    Div in note.
+    :::
+'''
+
+
+@pytest.mark.parametrize('filt_name', ('filter_divspans.DivSpanFilter',
+                                       'filter_pre.PreFilter',
+                                       'filter_nb_only.NbonlyFilter',
+                                       'filter_code.CodeFilter'))
+def test_filter_raw(filt_name):
+    mod_name, cls_name = filt_name.split('.')
+    filt = getattr(import_module(f'noteout.{mod_name}'), cls_name)
+    doc = pf.convert_text(RAW_MD, standalone=True)
+    exp_json = filter_doc(doc, filt).to_json()
+    raw_doc = doc.to_json()
+    assert filt.filter_raw(raw_doc) is raw_doc
+    assert raw_doc == exp_json
+    # Raw engine reading stdin, writing stdout, gives same output as Panflute
+    # engine.
+    in_bytes = json.dumps(doc.to_json()).encode('utf-8')
+    outputs = [run_stdio(partial(filt.main, engine=engine), in_bytes)
+               for engine in Filter.engines]
+    assert outputs[0] == outputs[1]
+    assert outputs[0] == json.dumps(exp_json, separators=(',', ':'),
+                                    ensure_ascii=False).encode('utf-8')
+    with pytest.raises(FilterError):
+        filt.main(engine='foo')
+
+
+def test_load_raw_keys():
+    doc = pf.convert_text(RAW_MD, standalone=True)
+    raw_doc = doc.to_json()
+    json_src = json.dumps(raw_doc)
+    for src in (json_src, json_src.encode('utf-8'),
+                json.dumps(raw_doc, indent=2)):
+        assert load_raw_keys(src, ['meta']) == {'meta': raw_doc['meta']}
+        values = load_raw_keys(src, ('pandoc-api-version', 'meta'))
+        assert raw_meta_doc(values).get_metadata() == doc.get_metadata()
+    # We don't decode after last needed key.
+    assert load_raw_keys('{"a": 1, "b": [2], "c": not_json}',
+                         'ab') == {'a': 1, 'b': [2]}
+    assert load_raw_keys('{"a": 1}', 'ab') == {'a': 1}
+    assert load_raw_keys(' { } ', 'a') == {}
+    with pytest.raises(ValueError):
+        load_raw_keys('[1, 2]', 'a')
+
+
+def test_pass_through(in_tmp_path):
+    doc = pf.convert_text(RAW_MD, standalone=True)
+    # Byte string that we would not get from re-encoding.
+    in_bytes = json.dumps(doc.to_json(), indent=1).encode('utf-8')
+    seen = []
+    out_stream = BytesIO()
+    pass_through(seen.append, BytesIO(in_bytes), out_stream)
+    assert seen == [in_bytes]
+    assert out_stream.getvalue() == in_bytes
+    # Metadata filter writes metadata as for Panflute filter.
+    assert run_stdio(write_meta.main, in_bytes) == in_bytes
+    write_meta.main(doc)
+    meta_0, meta_1 = (json.loads(Path(f'meta_00{i}.json').read_text())
+                      for i in range(2))
+    assert meta_0 == meta_1
+    assert meta_0['blurb'] == 'Meta with dropped span'
+
+
+@pytest.mark.parametrize('filt_name', ('filter_divspans.DivSpanFilter',
+                                       'filter_code.CodeFilter'))
+def test_pruned_walk(filt_name):
+    mod_name, cls_name = filt_name.split('.')
+    filt = getattr(import_module(f'noteout.{mod_name}'), cls_name)
+    doc = pf.convert_text(RAW_MD, standalone=True)
+    all_elems, target_elems = [], []
+
+    def count_action(elem, doc, elems):
+        elems.append(elem)
+        return filt.action(elem, doc)
+
+    full_doc = deepcopy(doc)
+    filt.prepare(full_doc)
+    full_doc.walk(partial(count_action, elems=all_elems))
+    filt.finalize(full_doc)
+    pruned_doc = deepcopy(doc)
+    filt.prepare(pruned_doc)
+    assert pruned_walk(pruned_doc,
+                       partial(count_action, elems=target_elems),
+                       pruned_doc,
+                       filt.target_types,
+                       filt.container_types) is pruned_doc
+    filt.finalize(pruned_doc)
+    assert pruned_doc.to_json() == full_doc.to_json()
+    assert pruned_doc.to_json() != doc.to_json()
+    assert filt.filter(doc) is doc
+    assert doc.to_json() == full_doc.to_json()
+    # Action only called for target types.
+    assert {type(e) for e in target_elems} == set(filt.target_types)
+    assert len(target_elems) < len(all_elems) / 5
+
+
+def test_clone_doc():
+    doc = pf.convert_text(RAW_MD, standalone=True)
+    doc.format = 'latex'
+    for strategy in ('json', 'deepcopy'):
+        copied = clone_doc(doc, strategy)
+        assert copied is not doc
+        assert copied.to_json() == doc.to_json()
+        assert copied.format == 'latex'
+        # Changing copy does not change original.
+        copied.content[0].content.append(pf.Str('Extra'))
+        copied.metadata['blurb'] = 'Changed'
+        assert copied.to_json() != doc.to_json()
+    para = doc.content[0]
+    assert clone_doc(para).to_json() == para.to_json()
+    assert clone_doc(doc, 'none') is doc
+    with pytest.raises(ValueError):
+        clone_doc(doc, 'foo')
+    # Filtering copies as requested.
+    exp_json = filter_doc(doc, DivSpanFilter, 'deepcopy').to_json()
+    assert filter_doc(doc, DivSpanFilter).to_json() == exp_json
+    assert doc.to_json() != exp_json
+    assert filter_doc(doc, DivSpanFilter, 'none') is doc
+    assert doc.to_json() == exp_json
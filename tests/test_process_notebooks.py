@@ -0,0 +1,828 @@
+""" Test notebook post-processing
+
+We build a minimal imitation of a rendered Quarto book, so we can test
+without running Quarto.  See ``test_qbook.py`` for tests on real renders.
+"""
+
+from copy import deepcopy
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import subprocess
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import jupytext
+from nbformat.v4 import new_notebook, new_markdown_cell, new_code_cell
+import yaml
+
+from noteout import process_notebooks as pn
+from noteout.nbio import read_nb
+from noteout.sync import write_changed
+from noteout.process_notebooks import (NBProcessor, NBProcessError, copy_nb,
+                                       rezip)
+
+import pytest
+
+
+QUARTO_CONFIG = {
+    'project': {'type': 'book'},
+    'noteout': {
+        'nb-format': 'ipynb',
+        'nb-dir': 'notebooks',
+        'interact-url': '/interact/lab/index.html?path=',
+        'book-url-root': 'https://example.com/my-book'},
+    'processing': {
+        'language': 'python',
+        'kernel-name': 'python',
+        'kernel-display': 'Python (Pyodide)',
+        'interact-data-root': None}
+}
+
+INTRO_HTML = '''\
+<html><body>
+<h1 class="title"><span id="sec-intro" class="quarto-section-identifier">
+<span class="chapter-number">1</span>&nbsp; <span
+class="chapter-title">Introduction</span></span></h1>
+<p>See <a href="#sec-detail" class="quarto-xref"><span>Section 1.1</span></a>
+and <a href="summary.html" class="quarto-xref"><span>Chapter 2</span></a>.</p>
+<section id="sec-detail"><h2>Detail</h2></section>
+</body></html>
+'''
+
+SUMMARY_HTML = '''\
+<html><body>
+<h1 class="title"><span id="sec-summary" class="quarto-section-identifier">
+<span class="chapter-number">2</span>&nbsp; <span
+class="chapter-title">Summary</span></span></h1>
+<p>Back to <a href="intro.html#sec-detail" class="quarto-xref"><span>Section
+1.1</span></a>.</p>
+</body></html>
+'''
+
+
+def unresolved(ref):
+    return (f'<a href="#{ref}" class="quarto-xref"><span '
+            f'class="quarto-unresolved-ref">{ref}</span></a>')
+
+
+XREF_MD = f'''\
+See {unresolved('sec-detail')} and {unresolved('sec-summary')}.
+
+Also {unresolved('sec-detail')} again, and {unresolved('sec-missing')}.'''
+
+PLAIN_MD = 'No references here; a < b && b > c.'
+
+DATA_CODE = "df = pd.read_csv('data/df.csv')\ndf.head()"
+
+
+NB = new_notebook(
+    cells=[new_markdown_cell(XREF_MD),
+           new_code_cell(DATA_CODE),
+           new_markdown_cell(PLAIN_MD)],
+    metadata={'kernelspec': {'name': 'python3',
+                             'display_name': 'Python 3'}})
+
+
+def make_nb():
+    return deepcopy(NB)
+
+
+def make_book(root_path, config=None):
+    """ Write imitation of rendered Quarto book to `root_path`
+    """
+    root_path = Path(root_path)
+    config = QUARTO_CONFIG if config is None else config
+    book_path = root_path / '_book'
+    nb_path = book_path / 'notebooks'
+    (nb_path / 'data').mkdir(parents=True)
+    (root_path / '_quarto.yml').write_text(yaml.dump(config))
+    (book_path / 'intro.html').write_text(INTRO_HTML)
+    (book_path / 'summary.html').write_text(SUMMARY_HTML)
+    (nb_path / 'data' / 'df.csv').write_text('a,b\n1,2\n3,4\n')
+    jupytext.write(make_nb(), nb_path / 'with_data.ipynb')
+    jupytext.write(make_nb(), nb_path / 'other.ipynb')
+    with ZipFile(nb_path / 'with_data.zip', 'w') as zf:
+        zf.write(nb_path / 'with_data.ipynb', 'with_data.ipynb')
+        zf.write(nb_path / 'data' / 'df.csv', 'data/df.csv')
+    return root_path / '_quarto.yml'
+
+
+@pytest.fixture
+def book_config(tmp_path):
+    return make_book(tmp_path / 'book')
+
+
+def md_sources(nb):
+    return [c['source'] for c in nb['cells'] if c['cell_type'] == 'markdown']
+
+
+def test_xrefs(book_config):
+    nbp = NBProcessor(book_config, book_config.parent / 'jl')
+    assert set(nbp.xrefs) == {'#sec-detail', '#sec-summary'}
+    assert nbp.xrefs['#sec-summary']['href'] == 'summary.html'
+    assert nbp.xrefs['#sec-detail']['href'] == 'intro.html#sec-detail'
+
+
+@pytest.mark.parametrize('engine', NBProcessor.xref_engines)
+def test_xref_sources(book_config, engine):
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', engine)
+    # No xrefs, no parsing, so no normalization of HTML-like text.
+    assert nbp.xref_sources(PLAIN_MD, ('a/', 'b/')) == [PLAIN_MD] * 3
+    resolved, pre_a, pre_b = nbp.xref_sources(XREF_MD, ('a/', 'b/'))
+    assert 'quarto-unresolved-ref">sec-detail' not in resolved
+    assert resolved.count('href="intro.html#sec-detail"') == 2
+    assert resolved.count('href="summary.html"') == 1
+    # Missing refs stay unresolved.
+    assert resolved.count('href="#sec-missing"') == 1
+    for prefix, out in (('a/', pre_a), ('b/', pre_b)):
+        assert out == resolved.replace('href="', f'href="{prefix}')
+    # Matches two-pass method.
+    nb = nbp.fix_xrefs(make_nb())
+    assert md_sources(nb)[0] == resolved
+    assert md_sources(nbp.prefix_xref(nb, 'a/'))[0] == pre_a
+    # The xrefs themselves remain unchanged.
+    assert nbp.xrefs['#sec-detail']['href'] == 'intro.html#sec-detail'
+
+
+@pytest.mark.parametrize('engine', NBProcessor.xref_engines)
+def test_xref_variants(book_config, engine):
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', engine)
+    nb = make_nb()
+    resolved, prefixed = nbp.xref_variants(nb, ('a/',))
+    assert nb == make_nb()
+    assert (md_sources(resolved)[0] ==
+            nbp.xref_sources(XREF_MD)[0])
+    assert (md_sources(prefixed)[0] ==
+            nbp.xref_sources(XREF_MD, ('a/',))[1])
+    for out_nb in (resolved, prefixed):
+        assert md_sources(out_nb)[1] == PLAIN_MD
+        assert out_nb['cells'][1] == nb['cells'][1]
+
+
+def test_copy_on_write(book_config):
+    nbp = NBProcessor(book_config, book_config.parent / 'jl')
+    nb = make_nb()
+    nb['cells'][1]['outputs'] = [{'output_type': 'stream',
+                                  'name': 'stdout',
+                                  'text': 'Big output\n' * 1000}]
+    orig_nb = deepcopy(nb)
+    resolved, prefixed = nbp.xref_variants(nb, ('a/',))
+    jl_nb = nbp._path_to_url(nbp.fix_kernels(copy_nb(prefixed)),
+                             root_url='https://d')
+    # Input notebooks unchanged.
+    assert nb == orig_nb
+    assert prefixed['metadata'] == orig_nb['metadata']
+    # Changed cells are new, unchanged cells are shared.
+    for out_nb in (resolved, prefixed, jl_nb):
+        assert out_nb['cells'][0] is not nb['cells'][0]
+        assert out_nb['cells'][2] is nb['cells'][2]
+    assert resolved['cells'][1] is nb['cells'][1]
+    assert jl_nb['cells'][1] is not nb['cells'][1]
+    assert jl_nb['cells'][1]['outputs'] is nb['cells'][1]['outputs']
+    assert "read_csv('https://d/df.csv')" in jl_nb['cells'][1]['source']
+    assert jl_nb['metadata']['kernelspec']['name'] == 'python'
+
+
+EQUIV_SOURCES = (
+    XREF_MD,
+    PLAIN_MD,
+    'Text <a class="quarto-xref" href="#sec-detail">link</a> end.',
+    "Single <a href='#sec-summary' class='quarto-xref other'>x</a>.",
+    'Upper <A HREF="#sec-detail" CLASS="quarto-xref"><span>x</span></A>',
+    'Extra <a id="an-id" href="#sec-detail" class="quarto-xref">x</a>.',
+    'Not xref <a href="#sec-detail" class="other">x</a> <a>y</a>.',
+    'Missing <a href="#sec-missing" class="quarto-xref">x</a>.',
+    'Mention of quarto-xref in text, not in link.',
+    '<a href="#sec-detail" class="quarto-xref">Unclosed',
+    'Quoted <a title="a>b" href="#sec-detail" class="quarto-xref">x</a>.',
+    "Quoted <a title='>' href='#sec-summary' class='quarto-xref'>x</a>.",
+)
+
+
+@pytest.mark.parametrize('source', EQUIV_SOURCES)
+def test_xref_engines_equiv(book_config, source):
+    jl_path = book_config.parent / 'jl'
+    soup_nbp = NBProcessor(book_config, jl_path, 'soup')
+    re_nbp = NBProcessor(book_config, jl_path, 'regex')
+    prefixes = ('https://example.com/my-book/', '/my-book/')
+    for resolve in (True, False):
+        soup_outs = soup_nbp.xref_sources(source, prefixes, resolve)
+        re_outs = re_nbp.xref_sources(source, prefixes, resolve)
+        # Outputs are the same, after HTML normalization.
+        assert ([str(soup_nbp._get_soup(s)) for s in re_outs] ==
+                [str(soup_nbp._get_soup(s)) for s in soup_outs])
+
+
+def test_xref_regex_in_place(book_config):
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'regex')
+    # Regex engine leaves surrounding text and HTML unchanged.
+    source = ('a < b &nbsp; <b   id=x>bold</b> ' + unresolved('sec-detail')
+              + ' <a href="#sec-detail" class="other">x</a>')
+    resolved, prefixed = nbp.xref_sources(source, ('p/',))
+    exp_xref = str(nbp.xrefs['#sec-detail'])
+    assert resolved == source.replace(unresolved('sec-detail'), exp_xref)
+    assert prefixed == resolved.replace(
+        exp_xref, exp_xref.replace('href="', 'href="p/'))
+    # Many unclosed tags; quadratic search would take minutes.
+    for tag in ('<a ', '<a x="', "<a x='\"", '<a x="a>'):
+        source = 'quarto-xref ' + tag * 100_000
+        assert nbp.xref_sources(source, ('p/',)) == [source, source]
+    with pytest.raises(ValueError):
+        NBProcessor(book_config, book_config.parent / 'jl', 'lxml')
+
+
+@pytest.mark.parametrize('engine', NBProcessor.xref_engines)
+@pytest.mark.parametrize('jobs', (1, 4))
+def test_process(book_config, engine, jobs):
+    jl_path = book_config.parent / 'jl'
+    nbp = NBProcessor(book_config, jl_path, engine, jobs=jobs)
+    nbp.process()
+    nb_path = book_config.parent / '_book' / 'notebooks'
+    dl_nb = jupytext.read(nb_path / 'with_data.ipynb')
+    dl_md = md_sources(dl_nb)
+    assert ('href="https://example.com/my-book/intro.html#sec-detail"'
+            in dl_md[0])
+    assert dl_md[1] == PLAIN_MD
+    assert dl_nb.metadata.kernelspec.name == 'python3'
+    with ZipFile(nb_path / 'with_data.zip') as zf:
+        assert sorted(zf.namelist()) == ['data/df.csv', 'with_data.ipynb']
+        assert (jupytext.reads(zf.read('with_data.ipynb').decode(), 'ipynb')
+                == dl_nb)
+    jl_nb = jupytext.read(jl_path / 'with_data.ipynb')
+    jl_md = md_sources(jl_nb)
+    assert 'href="/my-book/intro.html#sec-detail"' in jl_md[0]
+    assert jl_md[1] == PLAIN_MD
+    assert jl_nb.metadata.kernelspec == {'name': 'python',
+                                         'display_name': 'Python (Pyodide)'}
+    assert (jl_path / 'data' / 'df.csv').is_file()
+    assert (jl_path / 'other.ipynb').is_file()
+    assert (jl_path / 'jupyter-lite.json').is_file()
+
+
+def test_process_streams(book_config, monkeypatch):
+    # Each notebook is written before the next is read.
+    events = []
+
+    def log_read(path, *args, **kwargs):
+        events.append(('read', Path(path).name))
+        return read_nb(path, *args, **kwargs)
+
+    def log_write(path, content):
+        events.append(('write', Path(path).parent.name, Path(path).name))
+        return write_changed(path, content)
+
+    monkeypatch.setattr(pn, 'read_nb', log_read)
+    monkeypatch.setattr(pn, 'write_changed', log_write)
+    nbp = NBProcessor(book_config, book_config.parent / 'jl')
+    # Processing does not keep notebook contents.
+    results = []
+    nb_map = nbp._map
+    nbp._map = lambda *args, **kwargs: results.extend(
+        out := nb_map(*args, **kwargs)) or out
+    assert nbp.process() == 2
+    assert results == [None, None]
+    assert events[:1] == [('write', 'jl', 'jupyter-lite.json')]
+    assert events[1:] == [
+        ('read', 'other.ipynb'),
+        ('write', 'notebooks', 'other.ipynb'),
+        ('write', 'jl', 'other.ipynb'),
+        ('read', 'with_data.ipynb'),
+        ('write', 'notebooks', 'with_data.ipynb'),
+        ('write', 'jl', 'with_data.ipynb')]
+
+
+def test_targets(tmp_path):
+    config = deepcopy(QUARTO_CONFIG)
+    py_target = dict(config['processing'], **{'jl-out-dir': 'py'})
+    xeus_target = dict(config['processing'], **{
+        'jl-out-dir': 'xeus',
+        'kernel-name': 'xpython',
+        'kernel-display': 'Python (XPython)',
+        'interact-data-root': 'https://example.com/data'})
+    config['processing'] = [py_target, xeus_target]
+    q_config = make_book(tmp_path / 'book', config)
+    jl_path = tmp_path / 'book' / 'jl'
+    nbp = NBProcessor(q_config, jl_path, 'regex')
+    assert [t.jl_out_path for t in nbp.targets] == [jl_path / 'py',
+                                                    jl_path / 'xeus']
+    scanned = []
+    get_soup = nbp._get_soup
+    nbp._get_soup = lambda text: scanned.append(text) or get_soup(text)
+    nbp.process()
+    # HTML scanned once for all targets.
+    assert len(scanned) == 2
+    py_nb = read_nb(jl_path / 'py' / 'with_data.ipynb')
+    xeus_nb = read_nb(jl_path / 'xeus' / 'with_data.ipynb')
+    assert py_nb.metadata.kernelspec.name == 'python'
+    assert xeus_nb.metadata.kernelspec.name == 'xpython'
+    assert md_sources(py_nb) == md_sources(xeus_nb)
+    assert py_nb.cells[1].source == DATA_CODE
+    assert "read_csv('https://example.com/data/df.csv')" in (
+        xeus_nb.cells[1].source)
+    for target_dir in ('py', 'xeus'):
+        assert (jl_path / target_dir / 'data' / 'df.csv').is_file()
+        assert (jl_path / target_dir / 'jupyter-lite.json').is_file()
+    # Output directories relative to project, without JL output directory.
+    nbp = NBProcessor(q_config)
+    assert [t.jl_out_path for t in nbp.targets] == [
+        q_config.parent / 'py', q_config.parent / 'xeus']
+    # Need output directory for each target.
+    del config['processing'][1]['jl-out-dir']
+    q_config.write_text(yaml.dump(config))
+    with pytest.raises(ValueError):
+        NBProcessor(q_config, jl_path)
+    config['processing'][1]['jl-out-dir'] = 'py'
+    q_config.write_text(yaml.dump(config))
+    with pytest.raises(ValueError):
+        NBProcessor(q_config, jl_path)
+
+
+def test_contents_index(tmp_path):
+    config = deepcopy(QUARTO_CONFIG)
+    config['processing']['jl-contents-index'] = True
+    q_config = make_book(tmp_path / 'book', config)
+    jl_path = tmp_path / 'book' / 'jl'
+    NBProcessor(q_config, jl_path).process()
+    index_path = jl_path / 'api' / 'contents'
+    root = json.loads((index_path / 'all.json').read_text())
+    assert [m['name'] for m in root['content']] == [
+        'data', 'other.ipynb', 'with_data.ipynb']
+    assert root['content'][2]['size'] == (
+        jl_path / 'with_data.ipynb').stat().st_size
+    data = json.loads((index_path / 'data' / 'all.json').read_text())
+    assert [m['path'] for m in data['content']] == ['data/df.csv']
+
+
+def test_embed_data(tmp_path):
+    config = deepcopy(QUARTO_CONFIG)
+    config['processing'].update({
+        'interact-data-root': 'https://example.com/data',
+        'interact-data-embed': True,
+        'interact-data-max-size': 100,
+        'jl-contents-index': True})
+    q_config = make_book(tmp_path / 'book', config)
+    nb_path = tmp_path / 'book' / '_book' / 'notebooks'
+    (nb_path / 'top.csv').write_text('a\n1\n')
+    (nb_path / 'data' / 'big.csv').write_text('a\n' + '1\n' * 100)
+    code = ("top = pd.read_csv('top.csv')\n"
+            "big = pd.read_csv('data/big.csv')\n"
+            "missing = pd.read_csv('data/missing.csv')")
+    jupytext.write(new_notebook(cells=[new_code_cell(code)]),
+                   nb_path / 'reads.ipynb')
+    jl_path = tmp_path / 'book' / 'jl'
+    NBProcessor(q_config, jl_path).process()
+    # Small files keep local path.
+    assert read_nb(jl_path / 'with_data.ipynb').cells[1].source == DATA_CODE
+    jl_code = read_nb(jl_path / 'reads.ipynb').cells[0].source
+    assert "top = pd.read_csv('top.csv')\n" in jl_code
+    assert "big = pd.read_csv('https://example.com/data/big.csv')" in jl_code
+    assert ("missing = pd.read_csv('https://example.com/data/missing.csv')"
+            in jl_code)
+    # Embedded file copied and indexed.
+    assert (jl_path / 'top.csv').read_text() == 'a\n1\n'
+    root = json.loads((jl_path / 'api' / 'contents' / 'all.json').read_text())
+    assert 'top.csv' in [m['name'] for m in root['content']]
+    # No URL root; embed all.
+    config['processing']['interact-data-root'] = None
+    q_config.write_text(yaml.dump(config))
+    (jl_path / 'top.csv').unlink()
+    NBProcessor(q_config, jl_path).process()
+    assert read_nb(jl_path / 'reads.ipynb').cells[0].source == code
+    assert (jl_path / 'top.csv').is_file()
+
+
+DL_LINKS_HTML = '''\
+<div class="nb-links">
+<a class="notebook-link" href="notebooks/with_data.zip">Download zip</a>
+<a class="interact-button" href="/interact/lab/index.html?path=with_data.ipynb">Interact</a>
+</div>
+<div class="nb-links">
+<a class="notebook-link" href="notebooks/other.ipynb">Download notebook</a>
+</div>
+'''
+
+
+@pytest.mark.parametrize('mode', NBProcessor.dl_hash_modes)
+def test_dl_url_hash(tmp_path, mode):
+    config = deepcopy(QUARTO_CONFIG)
+    config['noteout']['dl-url-hash'] = mode
+    q_config = make_book(tmp_path / 'book', config)
+    book_path = q_config.parent / '_book'
+    nb_path = book_path / 'notebooks'
+    (book_path / 'links.html').write_text(DL_LINKS_HTML)
+    jl_path = q_config.parent / 'jl'
+    NBProcessor(q_config, jl_path, gzip=True).process()
+    manifest = json.loads((nb_path / 'manifest.json').read_text())
+    assert sorted(manifest) == ['notebooks/other.ipynb',
+                                'notebooks/with_data.ipynb',
+                                'notebooks/with_data.zip']
+
+    def digest(name):
+        return hashlib.sha256((nb_path / name).read_bytes()).hexdigest()[:12]
+
+    def zip_digest(name):
+        with ZipFile(nb_path / name) as zf:
+            members = sorted([i.filename, i.CRC, i.file_size]
+                             for i in zf.infolist())
+        return hashlib.sha256(
+            json.dumps(members).encode('utf-8')).hexdigest()[:12]
+
+    if mode == 'name':
+        exp_url = 'notebooks/other.{}.ipynb'.format(digest('other.ipynb'))
+        exp_zip_url = 'notebooks/with_data.{}.zip'.format(
+            zip_digest('with_data.zip'))
+        assert ((book_path / exp_url).read_bytes() ==
+                (nb_path / 'other.ipynb').read_bytes())
+        assert (book_path / (exp_url + '.gz')).is_file()
+        assert (book_path / exp_zip_url).is_file()
+    else:
+        exp_url = 'notebooks/other.ipynb?v={}'.format(digest('other.ipynb'))
+        exp_zip_url = 'notebooks/with_data.zip?v={}'.format(
+            zip_digest('with_data.zip'))
+    assert manifest['notebooks/other.ipynb'] == exp_url
+    assert manifest['notebooks/with_data.zip'] == exp_zip_url
+    html = (book_path / 'links.html').read_text()
+    assert DL_LINKS_HTML.replace(
+        'href="notebooks/other.ipynb"', f'href="{exp_url}"').replace(
+        'href="notebooks/with_data.zip"', f'href="{exp_zip_url}"') == html
+    # Hashed copies are not processed as notebooks.
+    assert sorted(p.name for p in jl_path.glob('*.ipynb')) == [
+        'other.ipynb', 'with_data.ipynb']
+    # Changed notebook; new hash in links, old hashed copies removed.
+    nb = make_nb()
+    nb.cells.append(new_markdown_cell('More'))
+    jupytext.write(nb, nb_path / 'other.ipynb')
+    NBProcessor(q_config, jl_path, gzip=True).process()
+    new_url = json.loads(
+        (nb_path / 'manifest.json').read_text())['notebooks/other.ipynb']
+    assert new_url != exp_url
+    assert f'href="{new_url}"' in (book_path / 'links.html').read_text()
+    assert len(list(nb_path.glob('other.*'))) == (
+        4 if mode == 'name' else 2)
+    # Rebuild with same contents, new timestamps; same zip URL.
+    df_path = nb_path / 'data' / 'df.csv'
+    st = df_path.stat()
+    os.utime(df_path, (st.st_atime + 100, st.st_mtime + 100))
+    jupytext.write(make_nb(), nb_path / 'with_data.ipynb')
+    with ZipFile(nb_path / 'with_data.zip', 'w') as zf:
+        zf.write(nb_path / 'with_data.ipynb', 'with_data.ipynb')
+        zf.write(df_path, 'data/df.csv')
+    NBProcessor(q_config, jl_path, gzip=True).process()
+    assert json.loads((nb_path / 'manifest.json').read_text())[
+        'notebooks/with_data.zip'] == exp_zip_url
+
+
+def test_copy_dirs(tmp_path):
+    config = deepcopy(QUARTO_CONFIG)
+    config['processing'].update({'jl-copy-link': True,
+                                 'jl-copy-delete': True,
+                                 'jl-contents-index': True})
+    q_config = make_book(tmp_path / 'book', config)
+    jl_path = tmp_path / 'book' / 'jl'
+    (jl_path / 'data').mkdir(parents=True)
+    (jl_path / 'data' / 'stale.csv').write_text('x\n')
+    (jl_path / '.hidden').mkdir()
+    nb_path = tmp_path / 'book' / '_book' / 'notebooks'
+    (nb_path / 'images').mkdir()
+    (nb_path / 'images' / 'x.png').write_bytes(b'png')
+    NBProcessor(q_config, jl_path).process()
+    assert (jl_path / 'data' / 'df.csv').samefile(nb_path / 'data' / 'df.csv')
+    assert not (jl_path / 'data' / 'stale.csv').exists()
+    assert (jl_path / 'images' / 'x.png').is_file()
+    # Directory removed from input; other outputs remain.
+    (nb_path / 'images' / 'x.png').unlink()
+    (nb_path / 'images').rmdir()
+    NBProcessor(q_config, jl_path).process()
+    assert not (jl_path / 'images').exists()
+    assert sorted(p.name for p in jl_path.iterdir()) == [
+        '.hidden', 'api', 'data', 'jupyter-lite.json', 'other.ipynb',
+        'with_data.ipynb']
+    assert (jl_path / 'api' / 'contents' / 'all.json').is_file()
+
+
+def test_rezip(tmp_path):
+    (tmp_path / 'data').mkdir()
+    df_path = tmp_path / 'data' / 'df.csv'
+    df_path.write_text('a,b\n' + '1,2\n' * 1000)
+    (tmp_path / 'nb.ipynb').write_text('{}')
+    zf_path = tmp_path / 'nb.zip'
+    with ZipFile(zf_path, 'w', ZIP_DEFLATED) as zf:
+        zf.write(tmp_path / 'nb.ipynb', 'nb.ipynb')
+        zf.write(df_path, 'data/df.csv')
+    with ZipFile(zf_path) as zf:
+        df_info = zf.getinfo('data/df.csv')
+    (tmp_path / 'nb.ipynb').write_text('{"new": 1}')
+    rezip(zf_path, {'nb.ipynb': b'{"new": 1}'})
+    with ZipFile(zf_path) as zf:
+        assert zf.testzip() is None
+        assert zf.namelist() == ['nb.ipynb', 'data/df.csv']
+        assert zf.read('nb.ipynb') == b'{"new": 1}'
+        assert zf.read('data/df.csv') == df_path.read_bytes()
+        # Compressed data copied from original.
+        out_info = zf.getinfo('data/df.csv')
+        for attr in ('compress_type', 'compress_size', 'CRC', 'date_time'):
+            assert getattr(out_info, attr) == getattr(df_info, attr)
+    # Changed file on disk replaces member.
+    df_path.write_text('a,b\n5,6\n')
+    rezip(zf_path, {})
+    with ZipFile(zf_path) as zf:
+        assert zf.read('data/df.csv') == b'a,b\n5,6\n'
+        assert zf.read('nb.ipynb') == b'{"new": 1}'
+        assert zf.getinfo('data/df.csv').compress_type == ZIP_DEFLATED
+    assert sorted(p.name for p in tmp_path.glob('*')) == [
+        'data', 'nb.ipynb', 'nb.zip']
+
+
+@pytest.mark.skipif(shutil.which('zip') is None, reason='Needs Info-ZIP')
+@pytest.mark.parametrize('raw_copy', (True, False))
+def test_rezip_info_zip(tmp_path, monkeypatch, raw_copy):
+    # Info-ZIP archive, with extra fields and data descriptors.
+    (tmp_path / 'data').mkdir()
+    df_path = tmp_path / 'data' / 'df.csv'
+    df_path.write_text('a,b\n' + '1,2\n' * 1000)
+    (tmp_path / 'nb.ipynb').write_text('{}')
+    subprocess.run(['zip', '-q', '-fd', 'nb.zip', 'nb.ipynb', 'data/df.csv'],
+                   cwd=tmp_path, check=True)
+    zf_path = tmp_path / 'nb.zip'
+    with ZipFile(zf_path) as zf:
+        assert zf.getinfo('data/df.csv').flag_bits & 0x08
+        assert zf.getinfo('data/df.csv').extra
+    if not raw_copy:  # Fallback if zipfile internals change.
+        monkeypatch.setattr(pn, '_can_copy_raw', lambda zin, zout: False)
+    rezip(zf_path, {'nb.ipynb': b'{"new": 1}'})
+    with ZipFile(zf_path) as zf:
+        assert zf.testzip() is None
+        assert zf.read('nb.ipynb') == b'{"new": 1}'
+        assert zf.read('data/df.csv') == df_path.read_bytes()
+        assert not zf.getinfo('data/df.csv').flag_bits & 0x08
+    if shutil.which('unzip'):
+        subprocess.run(['unzip', '-tq', str(zf_path)], check=True,
+                       capture_output=True)
+
+
+def file_contents(path):
+    if path.suffix != '.zip':
+        return path.read_bytes()
+    # Zip timestamps can differ between runs.
+    with ZipFile(path) as zf:
+        return {name: zf.read(name) for name in zf.namelist()}
+
+
+def tree_contents(root_path):
+    return {str(p.relative_to(root_path)): file_contents(p)
+            for p in sorted(root_path.rglob('*')) if p.is_file()}
+
+
+def test_jobs(tmp_path):
+    outputs = []
+    for jobs in (1, 3):
+        config = make_book(tmp_path / f'book_{jobs}')
+        for i in range(5):
+            jupytext.write(make_nb(), config.parent / '_book' / 'notebooks' /
+                           f'extra_{i}.ipynb')
+        nbp = NBProcessor(config, config.parent / 'jl', jobs=jobs)
+        assert [p.name for p, nb in nbp.read_nbs()] == (
+            [f'extra_{i}.ipynb' for i in range(5)] +
+            ['other.ipynb', 'with_data.ipynb'])
+        nbp.process()
+        outputs.append([tree_contents(config.parent / d)
+                        for d in ('_book', 'jl')])
+    assert outputs[0] == outputs[1]
+    assert NBProcessor(config, config.parent / 'jl', jobs=0).jobs > 0
+
+
+def test_incremental(tmp_path):
+    config = make_book(tmp_path / 'book')
+    ref_config = make_book(tmp_path / 'ref')
+    NBProcessor(ref_config, ref_config.parent / 'jl').process()
+    book_path = config.parent / '_book'
+    nb_path = book_path / 'notebooks'
+    jl_path = config.parent / 'jl'
+
+    def process(**kwargs):
+        return NBProcessor(config, jl_path, incremental=True,
+                           **kwargs).process()
+
+    def outputs(config):
+        return [tree_contents(config.parent / d) for d in ('_book', 'jl')]
+
+    assert process() == 2
+    assert outputs(config) == outputs(ref_config)
+    assert process(jobs=2) == 0
+    assert outputs(config) == outputs(ref_config)
+    # Quarto rewrites input notebooks and zip, with unchanged contents; we
+    # restore outputs from copies, without reprocessing.
+    for name in ('other.ipynb', 'with_data.ipynb'):
+        jupytext.write(make_nb(), nb_path / name)
+    with ZipFile(nb_path / 'with_data.zip', 'w') as zf:
+        zf.write(nb_path / 'with_data.ipynb', 'with_data.ipynb')
+        zf.write(nb_path / 'data' / 'df.csv', 'data/df.csv')
+    assert process() == 0
+    assert outputs(config) == outputs(ref_config)
+    # Quarto rewrites one input notebook, with changed, then original,
+    # contents.
+    changed_nb = make_nb()
+    changed_nb.cells.append(new_markdown_cell('More text'))
+    jupytext.write(changed_nb, nb_path / 'other.ipynb')
+    assert process() == 1
+    assert md_sources(read_nb(nb_path / 'other.ipynb'))[-1] == 'More text'
+    jupytext.write(make_nb(), nb_path / 'other.ipynb')
+    assert process() == 1
+    assert outputs(config) == outputs(ref_config)
+    # Missing output.
+    (jl_path / 'other.ipynb').unlink()
+    assert process() == 1
+    assert outputs(config) == outputs(ref_config)
+    # Changed data file; we reprocess from copy of input notebook.
+    (nb_path / 'data' / 'df.csv').write_text('a,b\n5,6\n')
+    assert process() == 2
+    ref_outputs = outputs(ref_config)
+    ref_outputs[0]['notebooks/with_data.zip']['data/df.csv'] = b'a,b\n5,6\n'
+    ref_outputs[0]['notebooks/data/df.csv'] = b'a,b\n5,6\n'
+    ref_outputs[1]['data/df.csv'] = b'a,b\n5,6\n'
+    assert outputs(config) == ref_outputs
+    # Changed xref target.
+    (book_path / 'intro.html').rename(book_path / 'chap1.html')
+    (book_path / 'summary.html').write_text(
+        SUMMARY_HTML.replace('intro.html', 'chap1.html'))
+    assert process() == 2
+    assert ('href="https://example.com/my-book/chap1.html#sec-detail"'
+            in md_sources(read_nb(nb_path / 'other.ipynb'))[0])
+    # Changed configuration.
+    assert process() == 0
+    assert process(minify=True) == 2
+    assert process(minify=True) == 0
+    assert (config.parent / '.noteout' / 'proc-state.json').is_file()
+
+
+def test_update(book_config):
+    book_path = book_config.parent / '_book'
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'regex',
+                      incremental=True)
+    assert nbp.process() == 2
+    scanned = []
+    get_soup = nbp._get_soup
+    nbp._get_soup = lambda text: scanned.append(text) or get_soup(text)
+    assert nbp.update() == 0
+    assert scanned == []
+    # Changed page, no changed xrefs.
+    (book_path / 'summary.html').write_text(SUMMARY_HTML + '<p>More</p>\n')
+    assert nbp.update() == 0
+    assert len(scanned) == 1
+    # Changed xref; both notebooks refer to it.
+    (book_path / 'intro.html').write_text(
+        INTRO_HTML.replace('Chapter 2', 'Chapter 3'))
+    assert nbp.update() == 2
+    assert len(scanned) == 2
+    assert 'Chapter 3' in md_sources(
+        read_nb(book_path / 'notebooks' / 'other.ipynb'))[0]
+
+
+def test_page_scans(book_config, monkeypatch):
+    # Incremental runs reuse saved page scans, without parsing pages.
+    book_path = book_config.parent / '_book'
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'soup',
+                      incremental=True)
+    assert nbp.process() == 2
+    assert (book_config.parent / '.noteout' / 'page-scans.json').is_file()
+    xrefs = {k: str(v) for k, v in nbp.xrefs.items()}
+    pages = []
+    get_soup = NBProcessor._get_soup
+    monkeypatch.setattr(
+        NBProcessor, '_get_soup',
+        lambda self, text: (pages.append(text) if '<body>' in text else None)
+        or get_soup(self, text))
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'soup',
+                      incremental=True)
+    assert nbp.process() == 0
+    assert pages == []
+    assert {k: str(v) for k, v in nbp.xrefs.items()} == xrefs
+    # Changed page.
+    (book_path / 'intro.html').write_text(
+        INTRO_HTML.replace('Chapter 2', 'Chapter 3'))
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'soup',
+                      incremental=True)
+    assert nbp.process() == 2
+    assert len(pages) == 1
+    # Non-incremental processing parses all pages.
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', 'soup')
+    nbp.xrefs
+    assert len(pages) == 3
+
+
+def test_watch(book_config, monkeypatch):
+    nb_path = book_config.parent / '_book' / 'notebooks'
+    nbp = NBProcessor(book_config, book_config.parent / 'jl')
+    n_processed = []
+    update = nbp.update
+    nbp.update = lambda: n_processed.append(update())
+    sleeps = []
+
+    def fake_sleep(seconds):
+        # Quarto writes changed input notebook during first wait.
+        if not sleeps:
+            nb = make_nb()
+            nb.cells.append(new_markdown_cell('More text'))
+            jupytext.write(nb, nb_path / 'other.ipynb')
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(pn, 'INotify', None)
+    monkeypatch.setattr(pn.time, 'sleep', fake_sleep)
+    nbp.watch(interval=1, settle=0.1, max_polls=3)
+    assert sleeps == [1, 0.1, 1, 1]
+    assert n_processed == [2, 1]
+    assert ('href="https://example.com/my-book/intro.html#sec-detail"'
+            in md_sources(read_nb(nb_path / 'other.ipynb'))[0])
+
+
+def test_watch_errors(book_config, monkeypatch, capsys):
+    nb_path = book_config.parent / '_book' / 'notebooks'
+    half_path = nb_path / 'half.ipynb'
+    nbp = NBProcessor(book_config, book_config.parent / 'jl')
+    n_processed = []
+    update = nbp.update
+    nbp.update = lambda: n_processed.append(update())
+    sleeps = []
+
+    def fake_sleep(seconds):
+        if not sleeps:  # Quarto starts writing notebook.
+            half_path.write_text('{"cells": [')
+        elif len(sleeps) == 2:  # Quarto finishes writing notebook.
+            jupytext.write(make_nb(), half_path)
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(pn, 'INotify', None)
+    monkeypatch.setattr(pn.time, 'sleep', fake_sleep)
+    nbp.watch(interval=1, settle=0.1, max_polls=3)
+    assert sleeps == [1, 0.1, 1, 0.1, 1]
+    # Failed update not counted; other notebooks not reprocessed on retry.
+    assert n_processed == [2, 1]
+    assert 'half.ipynb' in capsys.readouterr().err
+    assert ('href="https://example.com/my-book/intro.html#sec-detail"'
+            in md_sources(read_nb(half_path))[0])
+
+
+@pytest.mark.parametrize('jobs', (1, 3))
+def test_errors(book_config, jobs):
+    nb_path = book_config.parent / '_book' / 'notebooks'
+    for name in ('bad1', 'bad2'):
+        (nb_path / f'{name}.ipynb').write_text('{"not": "a notebook"')
+    nbp = NBProcessor(book_config, book_config.parent / 'jl', jobs=jobs)
+    with pytest.raises(NBProcessError) as excinfo:
+        nbp.read_nbs()
+    # All failures collected, in order.
+    assert [Path(label).name for label, e in excinfo.value.errors] == [
+        'bad1.ipynb', 'bad2.ipynb']
+    assert 'bad2.ipynb' in str(excinfo.value)
+
+
+def test_minify(tmp_path):
+    outputs = []
+    for minify in (False, True):
+        config = make_book(tmp_path / f'book_{minify}')
+        jl_path = config.parent / 'jl'
+        NBProcessor(config, jl_path, minify=minify).process()
+        outputs.append([(jl_path / 'with_data.ipynb').read_bytes(),
+                        jupytext.read(jl_path / 'with_data.ipynb')])
+    (full, full_nb), (mini, mini_nb) = outputs
+    assert len(mini) < len(full)
+    assert mini.count(b'\n') == 1
+    assert mini_nb == full_nb
+
+
+def test_gzip(book_config):
+    jl_path = book_config.parent / 'jl'
+    nb_path = book_config.parent / '_book' / 'notebooks'
+    NBProcessor(book_config, jl_path, incremental=True, minify=True,
+                strip_meta=True, gzip=True).process()
+    out_paths = [jl_path / 'jupyter-lite.json',
+                 jl_path / 'with_data.ipynb',
+                 jl_path / 'other.ipynb',
+                 nb_path / 'with_data.ipynb']
+    for path in out_paths:
+        gz_path = path.with_name(path.name + '.gz')
+        assert gzip.decompress(gz_path.read_bytes()) == path.read_bytes()
+    assert not (nb_path / 'with_data.zip.gz').exists()
+    # Unchanged outputs not rewritten.
+    def mtimes():
+        return {p.name: p.stat().st_mtime_ns for p in jl_path.glob('*')
+                if not p.name.startswith('other.')}
+
+    before = mtimes()
+    nb = make_nb()
+    nb.cells.append(new_markdown_cell('More text'))
+    jupytext.write(nb, nb_path / 'other.ipynb')
+    assert NBProcessor(book_config, jl_path, incremental=True, minify=True,
+                       strip_meta=True, gzip=True).process() == 1
+    assert mtimes() == before
+    # Restored download notebook has matching compressed copy.
+    jupytext.write(make_nb(), nb_path / 'with_data.ipynb')
+    assert NBProcessor(book_config, jl_path, incremental=True, minify=True,
+                       strip_meta=True, gzip=True).process() == 0
+    dl_path = nb_path / 'with_data.ipynb'
+    assert gzip.decompress(
+        dl_path.with_name(dl_path.name + '.gz').read_bytes()) == (
+            dl_path.read_bytes())
@@ -0,0 +1,107 @@
+""" Test sync module
+"""
+
+import os
+from pathlib import Path
+
+from noteout.sync import prune_dirs, sync_file, sync_tree, write_changed
+
+import pytest
+
+
+def write_tree(root_path, contents):
+    for rel_path, content in contents.items():
+        path = Path(root_path) / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def read_tree(root_path):
+    return {str(p.relative_to(root_path)): p.read_text()
+            for p in sorted(Path(root_path).rglob('*')) if p.is_file()}
+
+
+TREE = {'a.csv': 'a,b\n1,2\n',
+        'sub/b.csv': 'b\n3\n',
+        'sub/deeper/c.txt': 'Some text'}
+
+
+@pytest.mark.parametrize('compare', ('stat', 'content'))
+@pytest.mark.parametrize('link', (False, True))
+def test_sync_tree(tmp_path, compare, link):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    write_tree(src, TREE)
+    copied, deleted = sync_tree(src, dst, compare, link)
+    assert sorted(map(str, copied)) == sorted(TREE)
+    assert deleted == []
+    assert read_tree(dst) == TREE
+    # Nothing changed, nothing copied.
+    assert sync_tree(src, dst, compare, link) == ([], [])
+    # Replace one file.  Writing in place would change linked output files.
+    (src / 'sub' / 'b.csv').unlink()
+    (src / 'sub' / 'b.csv').write_text('b\n4\n')
+    assert sync_tree(src, dst, compare, link) == ([Path('sub/b.csv')], [])
+    exp_tree = dict(TREE, **{'sub/b.csv': 'b\n4\n'})
+    assert read_tree(dst) == exp_tree
+    # Extra files in output kept by default, deleted on request.
+    write_tree(dst, {'extra.txt': 'x', 'old/d.txt': 'y'})
+    assert sync_tree(src, dst, compare, link) == ([], [])
+    assert sync_tree(src, dst, compare, link, delete=True) == (
+        [], [Path('old/d.txt'), Path('extra.txt'), Path('old')])
+    assert read_tree(dst) == exp_tree
+    assert not (dst / 'old').exists()
+    # Linked files share storage with source.
+    assert os.path.samefile(src / 'a.csv', dst / 'a.csv') == link
+
+
+def test_sync_compare(tmp_path):
+    src, dst = tmp_path / 'src', tmp_path / 'dst'
+    write_tree(src, TREE)
+    sync_tree(src, dst)
+    # Same size and contents, different modification time.
+    c_path = dst / 'sub' / 'deeper' / 'c.txt'
+    st = c_path.stat()
+    os.utime(c_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert sync_tree(src, dst, 'content') == ([], [])
+    assert sync_tree(src, dst, 'stat') == (
+        [Path('sub/deeper/c.txt')], [])
+    # Same size and modification time, different contents.
+    c_path.write_text('Some TEXT')
+    os.utime(c_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert sync_tree(src, dst, 'stat') == ([], [])
+    assert sync_tree(src, dst, 'content') == (
+        [Path('sub/deeper/c.txt')], [])
+    assert read_tree(dst) == TREE
+    with pytest.raises(ValueError):
+        sync_tree(src, dst, 'hash')
+
+
+def test_write_changed(tmp_path):
+    path = tmp_path / 'sub' / 'f.txt'
+    assert write_changed(path, b'some text')
+    mtime = path.stat().st_mtime_ns
+    assert not write_changed(path, b'some text')
+    assert path.stat().st_mtime_ns == mtime
+    assert write_changed(path, b'other text')
+    assert path.read_bytes() == b'other text'
+
+
+def test_sync_file(tmp_path):
+    src, dst = tmp_path / 'src.txt', tmp_path / 'dst.txt'
+    src.write_text('Some text')
+    assert sync_file(src, dst)
+    assert not sync_file(src, dst)
+    assert not sync_file(src, dst, 'content')
+    assert dst.read_text() == 'Some text'
+
+
+def test_prune_dirs(tmp_path):
+    write_tree(tmp_path, {'top.txt': 'Top', **TREE,
+                          'old/d.txt': 'Old', 'keep/e.txt': 'Keep'})
+    (tmp_path / 'link').symlink_to(tmp_path / 'keep')
+    assert prune_dirs(tmp_path, {'sub', 'keep'}) == ['link', 'old']
+    assert read_tree(tmp_path) == {'top.txt': 'Top', 'a.csv': 'a,b\n1,2\n',
+                                   'keep/e.txt': 'Keep', **{
+                                       k: v for k, v in TREE.items()
+                                       if k.startswith('sub/')}}
+    assert prune_dirs(tmp_path, {'sub', 'keep'}) == []
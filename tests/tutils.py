@@ -3,7 +3,9 @@
 
 from copy import deepcopy
 from functools import partial
+from io import BytesIO, TextIOWrapper
 import json
+import sys
 
 from noteout.nutils import fmt2fmt, filter_doc
 import noteout.mark_notebooks as nmnb
@@ -73,8 +75,9 @@ def filter_doc_nometa(doc, filt_container):
 
 
 def filter_two_pass(doc):
-    for filt in (nmnb, nenb):
-        doc = filter_doc(doc, filt)
+    # Copy input doc, then filter copy in place.
+    doc = filter_doc(doc, nmnb)
+    doc = filter_doc(doc, nenb, copy='none')
     doc.metadata = {}
     return doc
 
@@ -84,3 +87,20 @@ q2fmt = partial(fmt2fmt, in_fmt='quarto-like')
 q2md = partial(q2fmt, out_fmt='markdown')
 
 q2doc = partial(q2fmt, out_fmt='panflute')
+
+
+def run_stdio(func, in_bytes):
+    """ Run `func` with `in_bytes` as stdin, return bytes written to stdout
+    """
+    saved = sys.stdin, sys.stdout
+    sys.stdin = TextIOWrapper(BytesIO(in_bytes), 'utf-8')
+    out_buf = BytesIO()
+    out_buf.close = lambda: None  # Keep buffer when stdout replaced.
+    sys.stdout = TextIOWrapper(out_buf, 'utf-8')
+    try:
+        func()
+        sys.stdout.flush()
+    finally:
+        sys.stdin, sys.stdout = saved
+    return out_buf.getvalue()
+
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+""" Benchmark import times for Noteout entry points
+
+For each script entry point in ``pyproject.toml``, time the import of the
+entry point module in a new Python process, with ``python -X importtime``, and
+report the best time over several runs.
+
+Use ``--baseline`` to compare against times saved from an earlier run with
+``--save``, and fail if any import is slower than the baseline by more than
+``--tolerance``.
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from ast import literal_eval
+import json
+from pathlib import Path
+import re
+import subprocess
+import sys
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
+
+ROOT_PATH = Path(__file__).parent.parent
+
+# Heavy modules that we import only on use.
+HEAVY_MODULES = ('jupytext', 'nbformat', 'bs4')
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(\S+)$')
+
+
+def get_entry_points(pyproject_path=ROOT_PATH / 'pyproject.toml'):
+    """ Return dict of script name: module name from `pyproject_path`
+    """
+    with open(pyproject_path, 'rb') as fobj:
+        config = tomllib.load(fobj)
+    return {name: spec.split(':')[0]
+            for name, spec in config['project']['scripts'].items()}
+
+
+def time_import(mod_name):
+    """ Import `mod_name` in new process, return microseconds, heavy modules
+
+    Returns None if the import fails.
+    """
+    code = (f'import sys, {mod_name}; '
+            f'print([m for m in {HEAVY_MODULES} if m in sys.modules])')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          capture_output=True, text=True)
+    if proc.returncode:
+        return None
+    for line in proc.stderr.splitlines():
+        if (match := IMPORTTIME_RE.match(line)) and match[2] == mod_name:
+            return int(match[1]), literal_eval(proc.stdout)
+    raise RuntimeError(f'No import time for {mod_name}')
+
+
+def bench(entry_points, n_runs=5):
+    """ Return dict of script name: (best microseconds, heavy modules)
+
+    Value is None for entry points where the import fails.
+    """
+    times = {}
+    for name, mod_name in entry_points.items():
+        runs = [time_import(mod_name) for i in range(n_runs)]
+        times[name] = (None if None in runs else
+                       (min(r[0] for r in runs), runs[0][1]))
+    return times
+
+
+def get_parser():
+    parser = ArgumentParser(description=__doc__,  # Usage from docstring
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--n-runs', type=int, default=5,
+                        help='Number of runs for each import')
+    parser.add_argument('--save',
+                        help='Save import times to this JSON file')
+    parser.add_argument('--baseline',
+                        help='Compare against import times in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed fractional slowdown from baseline')
+    return parser
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    times = bench(get_entry_points(), args.n_runs)
+    baseline = (json.loads(Path(args.baseline).read_text())
+                if args.baseline else {})
+    slow = []
+    for name, timing in times.items():
+        if timing is None:
+            print(f'{name:30} import failed')
+            continue
+        us, heavy = timing
+        line = f'{name:30} {us / 1000:8.1f} ms'
+        if name in baseline:
+            ratio = us / baseline[name]
+            line += f' ({ratio:.2f} of baseline)'
+            if ratio > 1 + args.tolerance:
+                slow.append(name)
+        if heavy:
+            line += f'; imports {", ".join(heavy)}'
+        print(line)
+    if args.save:
+        Path(args.save).write_text(
+            json.dumps({name: t[0] for name, t in times.items() if t},
+                       indent=2))
+    if slow:
+        sys.exit(f'Imports slower than baseline: {", ".join(slow)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+""" Benchmark ``quartoize`` against regular expression substitution
+
+Build Markdown inputs of a given size from Quarto-style code blocks and text,
+from unclosed code blocks, and from code block starts without closing braces,
+and time ``nutils.quartoize`` (line
+scanner) and substitution with ``nutils._BACKTICK_BLOCK_RE``.  Check the
+outputs are the same.
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import time
+
+from noteout.nutils import quartoize, _BACKTICK_BLOCK_RE, _BACKTICK_SUB_PAT
+
+CHUNK = '''\
+Some text with `inline code`, and *emphasis*.
+
+```{r eval=FALSE}
+a <- 1
+f <- function(x) {
+  x + 1
+}
+```
+
+More text.
+
+```python
+print('Plain code block')
+```
+
+'''
+
+# Code block without end.  For each of these, the regular expression searches
+# to the end of the input.
+UNCLOSED = '''\
+```{r}
+b <- 2
+
+'''
+
+# Code block start without closing brace.  For each of these, the regular
+# expression searches to the end of the input for a closing brace.
+UNCLOSED_BRACE = '```{r x\n'
+
+
+def regex_quartoize(in_md):
+    return _BACKTICK_BLOCK_RE.sub(_BACKTICK_SUB_PAT, in_md)
+
+
+def make_md(n_bytes, chunk=CHUNK):
+    """ Make Markdown of about `n_bytes` from repeats of `chunk`
+    """
+    return chunk * (n_bytes // len(chunk) + 1)
+
+
+def best_time(func, arg, n_runs):
+    times = []
+    for i in range(n_runs):
+        start = time.perf_counter()
+        out = func(arg)
+        times.append(time.perf_counter() - start)
+    return min(times), out
+
+
+def get_parser():
+    parser = ArgumentParser(description=__doc__,  # Usage from docstring
+                            formatter_class=RawDescriptionHelpFormatter)
+    parser.add_argument('--mb', type=float, default=4,
+                        help='Size of balanced input in megabytes')
+    parser.add_argument('--unclosed-kb', type=float, default=10,
+                        help='Size of inputs with unclosed blocks, and '
+                        'with unclosed braces, in kilobytes; regular '
+                        'expression time is quadratic in this size')
+    parser.add_argument('-n', '--n-runs', type=int, default=3,
+                        help='Number of runs for each benchmark')
+    return parser
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+    inputs = {
+        'balanced': make_md(int(args.mb * 2 ** 20)),
+        'unclosed': make_md(int(args.unclosed_kb * 2 ** 10), UNCLOSED),
+        'no-brace': make_md(int(args.unclosed_kb * 2 ** 10), UNCLOSED_BRACE),
+    }
+    for name, in_md in inputs.items():
+        scan_t, scan_out = best_time(quartoize, in_md, args.n_runs)
+        re_t, re_out = best_time(regex_quartoize, in_md, args.n_runs)
+        assert scan_out == re_out
+        print(f'{name:10} {len(in_md) / 2 ** 20:6.2f} MB; '
+              f'scanner {scan_t:8.3f} s; regex {re_t:8.3f} s')
+
+
+if __name__ == '__main__':
+    main()
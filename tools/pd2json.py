@@ -1,38 +1,153 @@
 #!/usr/bin/env python
-""" Dump file to prettified Pandoc JSON
+""" Dump files to prettified Pandoc JSON
+
+Write Pandoc JSON for each input file to a file with the same name and suffix
+``.json``.  Inputs can be filenames or glob patterns, such as
+``'chapters/**/*.qmd'``; quote patterns to pass them through the shell.
+
+By default, we skip inputs with output files newer than the input; use
+``--force`` to convert all inputs.  Use ``--jobs`` to run several Pandoc
+processes at once.
+
+With ``--indent 0``, Pandoc writes compact JSON directly to the output file.
+Otherwise we decode Pandoc's output once, and stream the indented JSON to the
+output file.
 """
 
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from glob import glob
 import json
+import os
 from pathlib import Path
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import sys
 
 import panflute as pt
 
 
-def parse_fname(fname):
-    with open(fname, 'rt') as fobj:
-        contents = fobj.read()
-    return pt.convert_text(contents, output_format='json')
+def expand_inputs(specs):
+    """ Return unique paths from filenames or glob patterns in `specs`
+    """
+    paths = {}
+    for spec in specs:
+        matches = sorted(glob(spec, recursive=True)) or [spec]
+        paths.update((Path(m), None) for m in matches)
+    return list(paths)
+
+
+def out_path_for(in_path):
+    return Path(in_path).with_suffix('.json')
+
+
+def up_to_date(in_path, out_path):
+    """ True if `out_path` exists, and is newer than `in_path`
+    """
+    try:
+        out_mtime = out_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    return out_mtime >= in_path.stat().st_mtime_ns
+
+
+def convert(in_path, indent=2):
+    """ Write Pandoc JSON for `in_path` with `indent`, return output path
+    """
+    in_path = Path(in_path)
+    out_path = out_path_for(in_path)
+    # Write to temporary file, so an interrupted run leaves no output newer
+    # than its input.
+    tmp_path = out_path.with_name(out_path.name + '.tmp')
+    args = ['--from=markdown', '--to=json', str(in_path)]
+    try:
+        if indent:
+            out_str = pt.run_pandoc(args=args)
+            with open(tmp_path, 'wt', encoding='utf-8') as fobj:
+                json.dump(json.loads(out_str), fobj, indent=indent)
+        else:
+            pt.run_pandoc(args=args + ['--output', str(tmp_path)])
+        os.replace(tmp_path, out_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return out_path
+
+
+def _outcome(func, item):
+    try:
+        return func(item), None
+    except Exception as e:
+        return None, e
+
+
+def convert_all(in_paths, indent=2, jobs=1, force=False):
+    """ Convert `in_paths` to Pandoc JSON, with `jobs` threads
+
+    Parameters
+    ----------
+    in_paths : sequence
+        Input paths.
+    indent : int, optional
+        Indent for JSON output.  0 gives compact JSON.
+    jobs : int, optional
+        Number of conversions to run at once.  None or 0 means use number of
+        CPUs.
+    force : {False, True}, optional
+        If True, convert inputs with up to date outputs.
+
+    Returns
+    -------
+    converted : list
+        Output paths that we wrote.
+    skipped : list
+        Input paths with up to date outputs.
+    errors : list
+        ``(in_path, exception)`` tuples for failed conversions.
+    """
+    jobs = os.cpu_count() if jobs in (None, 0) else jobs
+    to_convert, skipped = [], []
+    for in_path in in_paths:
+        if not force and up_to_date(in_path, out_path_for(in_path)):
+            skipped.append(in_path)
+        else:
+            to_convert.append(in_path)
+    func = partial(_outcome, partial(convert, indent=indent))
+    if jobs == 1 or len(to_convert) < 2:
+        outcomes = [func(p) for p in to_convert]
+    else:
+        with ThreadPoolExecutor(jobs) as executor:
+            outcomes = list(executor.map(func, to_convert))
+    converted = [out for out, e in outcomes if e is None]
+    errors = [(p, e) for p, (out, e) in zip(to_convert, outcomes)
+              if e is not None]
+    return converted, skipped, errors
 
 
 def get_parser():
     parser = ArgumentParser(description=__doc__,  # Usage from docstring
                             formatter_class=RawDescriptionHelpFormatter)
-    parser.add_argument('fname',
-                        help='Filename to encode to JSON')
-    parser.add_argument('--indent', default=2,
-                        help='Indentation level (int)')
+    parser.add_argument('fnames', nargs='+',
+                        help='Filenames or glob patterns to encode to JSON')
+    parser.add_argument('--indent', type=int, default=2,
+                        help='Indentation level (0 for compact JSON)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='Number of conversions to run at once '
+                        '(0 for number of CPUs)')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='Convert inputs with up to date outputs')
     return parser
 
 
 def main():
     parser = get_parser()
     args = parser.parse_args()
-    out_str = parse_fname(args.fname)
-    out_json = json.loads(out_str)
-    out_fname = Path(args.fname).with_suffix('.json')
-    with open(out_fname, 'wt') as fobj:
-        json.dump(out_json, fobj, indent=args.indent)
+    converted, skipped, errors = convert_all(expand_inputs(args.fnames),
+                                             args.indent,
+                                             args.jobs,
+                                             args.force)
+    print(f'Converted {len(converted)}, skipped {len(skipped)} up to date')
+    if errors:
+        sys.exit('Failed to convert:\n' + '\n'.join(
+            f'{p}: {e!r}' for p, e in errors))
 
 
 if __name__ == '__main__':